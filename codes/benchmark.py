@@ -0,0 +1,333 @@
+"""
+流水线各阶段的基准测试
+
+阶段：噪声生成（Perlin NumPy / Numba 融合内核 / 频谱合成）、功率谱（makeimg 逐张 fft2 / spectrum 批量 rfft2）、
+染色 Excel、标量场 PNG、exp2 方框、exp3 剖面、findvalue 查值。
+在 shape × octaves × colormap 的矩阵上逐项运行，记录墙钟时间、CPU 时间、峰值内存（RSS）
+和吞吐量（像素/秒、文件/秒、点/秒），结果保存为 JSON；指定基线 JSON 时自动对比并标出变慢的项。
+
+每个用例在单独的子进程（spawn）里运行，峰值 RSS 互不影响；
+rss_delta_mb 为该阶段在准备好输入数据之后新增的峰值内存。
+"""
+
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows 上没有 resource 模块，不记录 RSS
+    resource = None
+
+CODES_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT_DIR = os.path.join(CODES_DIR, '..', 'data', 'bench')
+
+SHAPES = [(256, 256), (630, 820), (4096, 4096)]
+QUICK_SHAPES = [(256, 256), (630, 820)]
+OCTAVES = [1, 5]
+COLORMAPS = ['gray', 'hot', 'rainbow']
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位是 KB，macOS 上是字节
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+# ---------- 各阶段，返回本次处理的数量 {单位: 数量} ----------
+def bench_noise(noise, shape, octaves, colormap, workdir):
+    from noisegen import generate_seamless_perlin_noise_2d
+    generate_seamless_perlin_noise_2d(shape, (4, 4), octaves, rng=np.random.default_rng(1))
+    return {'pixels': shape[0] * shape[1]}
+
+
+def bench_noise_fused(noise, shape, octaves, colormap, workdir):
+    import noisegen
+    if noisegen.numba is None:
+        raise RuntimeError("未安装 numba")
+    # 第一次调用含 JIT 编译（cache=True 时之后从磁盘缓存加载），repeat > 1 时取最短时间即可排除
+    noisegen.generate_perlin_noise_fused(shape, (4, 4), octaves, rng=np.random.default_rng(1))
+    return {'pixels': shape[0] * shape[1]}
+
+
+def bench_spectral_noise(noise, shape, octaves, colormap, workdir):
+    from spectralnoise import generate_spectral_noise_2d
+    generate_spectral_noise_2d(shape, (4, 4), octaves, rng=np.random.default_rng(1))
+    return {'pixels': shape[0] * shape[1]}
+
+
+def bench_power_spectrum(noise, shape, octaves, colormap, workdir):
+    from makeimg import compute_power_spectrum
+    compute_power_spectrum(noise)
+    return {'pixels': shape[0] * shape[1]}
+
+
+def bench_spectrum(noise, shape, octaves, colormap, workdir, fields=5):
+    # exp1makepic 扫描结束后的频谱核对：一轮 5 张场一起算径向功率谱和斜率
+    from spectrum import analyze_fields
+    analyze_fields([noise] * fields, fmin=0.01, fmax=0.1)
+    return {'pixels': fields * shape[0] * shape[1]}
+
+
+def bench_excel(noise, shape, octaves, colormap, workdir):
+    from excelwriter import save_colored_excel
+    save_colored_excel(noise, os.path.join(workdir, 'colored.xlsx'), colormap)
+    return {'pixels': shape[0] * shape[1], 'files': 1}
+
+
+def bench_scalar_png(noise, shape, octaves, colormap, workdir):
+    from raster import save_scalar_field_png
+    save_scalar_field_png(noise, colormap, os.path.join(workdir, 'scalar.png'))
+    return {'pixels': shape[0] * shape[1], 'files': 1}
+
+
+def bench_exp2_boxes(noise, shape, octaves, colormap, workdir):
+    from exp2makepic import generate_image_with_boxes_and_compare
+    generate_image_with_boxes_and_compare(noise, colormap, os.path.join(workdir, 'boxes.png'),
+                                          os.path.join(workdir, 'boxes.txt'), box_count=8, rng=0)
+    return {'pixels': 8 * shape[0] * shape[1], 'files': 8}
+
+
+def bench_exp3_profiles(noise, shape, octaves, colormap, workdir):
+    from exp3makepic import generate_profile_round
+    from profiles import ProfileIndex
+    index = ProfileIndex(noise, length=351, margin=30)
+    generate_profile_round(index, 'bench', colormap, 1, workdir, np.random.default_rng(0), (-1.0, 0.95))
+    return {'files': 2}
+
+
+def bench_findvalue(noise, shape, octaves, colormap, workdir, points=2000):
+    from fieldstore import FieldStore
+    from findvalue import process_coordinates
+    field_path = FieldStore(workdir).save('field', noise)
+    rng = np.random.default_rng(0)
+    answer_file = os.path.join(workdir, 'answers.txt')
+    with open(answer_file, 'w', encoding='utf-8') as f:
+        for k in range(points):
+            if k % 5 == 0:
+                f.write(f"Image {k // 5 % 5 + 1}\n")
+            f.write(f"{rng.choice([1.0, 0.8, 0.6, 0.4, 0.2])}: "
+                    f"({rng.integers(shape[0])}, {rng.integers(shape[1])})\n")
+    mapping = {str(k): field_path for k in range(1, 6)}
+    process_coordinates(answer_file, mapping, os.path.join(workdir, 'result.txt'),
+                        os.path.join(workdir, 'log.txt'))
+    return {'points': points, 'files': 1}
+
+
+def fits_exp2(shape, size=100, margin=30):
+    """exp2 能否放下两个不重叠的方框（与 boxstats.sample_box_pairs 的检查相同）"""
+    room_y, room_x = (n - size - 2 * margin for n in shape)
+    return min(room_x, room_y) >= 0 and max(room_x, room_y) >= size
+
+
+def fits_exp3(shape, length=351, margin=30):
+    """exp3 能否放下一条剖面（与 ProfileIndex 的可选行列范围相同）"""
+    height, width = shape
+    return height >= 2 * margin and width >= length + 2 * margin
+
+
+# 阶段名 -> (函数, 是否随 colormap 变化, 是否随 octaves 变化, 像素数上限, shape 是否可用)
+# 实验本身放不下方框 / 剖面的 shape 不生成用例
+STAGES = {
+    'noise': (bench_noise, False, True, None, None),
+    'noise_fused': (bench_noise_fused, False, True, None, None),
+    'spectral_noise': (bench_spectral_noise, False, True, None, None),
+    'power_spectrum': (bench_power_spectrum, False, False, None, None),
+    'spectrum': (bench_spectrum, False, False, None, None),
+    'excel': (bench_excel, True, False, 630 * 820, None),  # 4096² 的 Excel 超过 1600 万个单元格，意义不大
+    'scalar_png': (bench_scalar_png, True, False, None, None),
+    'exp2_boxes': (bench_exp2_boxes, True, False, None, fits_exp2),
+    'exp3_profiles': (bench_exp3_profiles, True, False, None, fits_exp3),
+    'findvalue': (bench_findvalue, False, False, None, None),
+}
+
+
+def build_cases(stages=None, shapes=SHAPES, octaves_list=OCTAVES, colormaps=COLORMAPS):
+    """
+    展开用例矩阵；与 colormap / octaves 无关的阶段只取第一个值。
+    超出像素数上限或实验放不下的 shape 不生成用例；没有安装 numba 时默认不跑融合内核（显式指定时照常报错）。
+    """
+    cases = []
+    for stage in stages or STAGES:
+        _, uses_colormap, uses_octaves, max_pixels, fits = STAGES[stage]
+        if stage == 'noise_fused' and not stages and importlib.util.find_spec('numba') is None:
+            continue
+        for shape in shapes:
+            if max_pixels is not None and shape[0] * shape[1] > max_pixels:
+                continue
+            if fits is not None and not fits(shape):
+                continue
+            for octaves in (octaves_list if uses_octaves else octaves_list[-1:]):
+                for colormap in (colormaps if uses_colormap else colormaps[:1]):
+                    cases.append({'stage': stage, 'shape': list(shape), 'octaves': octaves, 'colormap': colormap})
+    return cases
+
+
+def run_case(case, repeat=3):
+    """在子进程中执行：先准备输入噪声（不计时），再重复运行 repeat 次"""
+    for sub in ('exp1', 'exp2', 'exp3'):
+        sys.path.append(os.path.join(CODES_DIR, sub))
+    sys.path.insert(0, CODES_DIR)
+    import matplotlib
+    matplotlib.use('Agg')
+    from noisegen import generate_seamless_perlin_noise_2d
+
+    func = STAGES[case['stage']][0]
+    shape = tuple(case['shape'])
+    noise = generate_seamless_perlin_noise_2d(shape, (4, 4), case['octaves'], rng=np.random.default_rng(0))
+    noise = (noise - noise.min()) / (noise.max() - noise.min())
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    rss_before = _peak_rss_mb()
+    walls, cpus = [], []
+    try:
+        for _ in range(repeat):
+            cpu_start = time.process_time()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):  # 各阶段自己的进度输出不打印
+                units = func(noise, shape, case['octaves'], case['colormap'], workdir)
+            walls.append(time.perf_counter() - start)
+            cpus.append(time.process_time() - cpu_start)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    peak = _peak_rss_mb()
+
+    wall = min(walls)
+    result = dict(case, wall_s=wall, wall_median_s=float(np.median(walls)), cpu_s=min(cpus), repeat=repeat,
+                  peak_rss_mb=peak, rss_delta_mb=None if peak is None else max(0.0, peak - rss_before))
+    for unit, count in units.items():
+        result[f'{unit}_per_s'] = count / max(wall, 1e-9)
+    return result
+
+
+def run_benchmarks(cases, repeat=3):
+    ctx = get_context('spawn')
+    results = []
+    for k, case in enumerate(cases, start=1):
+        label = f"{case['stage']} {tuple(case['shape'])} oct={case['octaves']} {case['colormap']}"
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            try:
+                result = pool.submit(run_case, case, repeat).result()
+            except Exception as e:
+                result = dict(case, error=repr(e))
+        results.append(result)
+        if 'error' in result:
+            print(f"[{k}/{len(cases)}] {label}: 失败（{result['error']}）")
+        else:
+            print(f"[{k}/{len(cases)}] {label}: {result['wall_s'] * 1000:.1f} ms")
+    return results
+
+
+def environment():
+    return {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+
+
+def case_key(result):
+    return (result['stage'], tuple(result['shape']), result['octaves'], result['colormap'])
+
+
+def compare(results, baseline, threshold=0.2):
+    """与基线逐项对比，墙钟时间变慢超过 threshold（比例）的记为回退，返回这些项"""
+    base = {case_key(r): r for r in baseline['results'] if 'error' not in r}
+    regressions = []
+    for result in results:
+        old = base.get(case_key(result))
+        if old is None or 'error' in result:
+            continue
+        ratio = result['wall_s'] / max(old['wall_s'], 1e-9)
+        result['baseline_wall_s'] = old['wall_s']
+        result['ratio'] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(result)
+    return regressions
+
+
+def check_fused_backend(shape=(630, 820), res=(4, 4), octaves=5):
+    """Numba 融合内核与 NumPy 实现的最大绝对误差（相同种子）；没有 numba 时返回 None"""
+    import noisegen
+    if noisegen.numba is None:
+        return None
+    fused = noisegen.generate_perlin_noise_fused(shape, res, octaves, rng=np.random.default_rng(0))
+    reference = noisegen.generate_seamless_perlin_noise_2d(shape, res, octaves, rng=np.random.default_rng(0))
+    return float(np.abs(fused - reference).max())
+
+
+def backend_speedups(results, stage='noise_fused', reference='noise'):
+    """同一 (shape, octaves) 下 reference 阶段与 stage 阶段墙钟时间之比"""
+    ref = {(tuple(r['shape']), r['octaves']): r['wall_s'] for r in results
+           if r['stage'] == reference and 'error' not in r}
+    return {(tuple(r['shape']), r['octaves']): ref[(tuple(r['shape']), r['octaves'])] / max(r['wall_s'], 1e-9)
+            for r in results if r['stage'] == stage and 'error' not in r
+            and (tuple(r['shape']), r['octaves']) in ref}
+
+
+def print_table(results):
+    print(f"{'阶段':<16}{'shape':<14}{'oct':>4} {'colormap':<9}{'wall ms':>10}{'cpu ms':>10}"
+          f"{'RSS MB':>9}{'Mpx/s':>9}{'files/s':>9}{'vs基线':>8}")
+    for r in results:
+        if 'error' in r:
+            continue
+        rss = '' if r['peak_rss_mb'] is None else f"{r['peak_rss_mb']:.0f}"
+        mpx = f"{r['pixels_per_s'] / 1e6:.1f}" if 'pixels_per_s' in r else ''
+        fps = f"{r['files_per_s']:.1f}" if 'files_per_s' in r else ''
+        ratio = f"{r['ratio']:.2f}x" if 'ratio' in r else ''
+        print(f"{r['stage']:<16}{str(tuple(r['shape'])):<14}{r['octaves']:>4} {r['colormap']:<9}"
+              f"{r['wall_s'] * 1000:>10.1f}{r['cpu_s'] * 1000:>10.1f}{rss:>9}{mpx:>9}{fps:>9}{ratio:>8}")
+
+
+def main():
+    quick = True          # True 时只跑 256² 和 630×820，False 时加上 4096²
+    stages = None         # 只跑部分阶段，如 ['noise', 'scalar_png']；None 表示全部
+    repeat = 3            # 每个用例重复次数，取最短时间
+    baseline_path = None  # 之前某次的 JSON 结果，用于对比回退
+    threshold = 0.2       # 比基线慢 20% 以上记为回退
+
+    cases = build_cases(stages, QUICK_SHAPES if quick else SHAPES)
+    results = run_benchmarks(cases, repeat)
+
+    report = {'environment': environment(), 'results': results}
+    fused_error = check_fused_backend()
+    speedups = backend_speedups(results)
+    if fused_error is not None:
+        report['fused_max_abs_error'] = fused_error
+        report['fused_speedup'] = [{'shape': list(k[0]), 'octaves': k[1], 'speedup': v} for k, v in speedups.items()]
+    regressions = []
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), threshold)
+        report['baseline'] = baseline_path
+        report['regressions'] = [case_key(r) for r in regressions]
+
+    os.makedirs(DEFAULT_OUTPUT_DIR, exist_ok=True)
+    output = os.path.join(DEFAULT_OUTPUT_DIR, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+
+    print_table(results)
+    if fused_error is None:
+        print("未安装 numba，跳过融合内核（perlin_fused 引擎回退到 NumPy 实现）")
+    else:
+        print(f"融合内核与 NumPy 实现的最大绝对误差: {fused_error:.3g}")
+        for (shape, octaves), speedup in speedups.items():
+            print(f"  {shape} oct={octaves}: 融合内核加速 {speedup:.1f}x")
+    for r in regressions:
+        print(f"⚠️ 回退: {r['stage']} {tuple(r['shape'])} oct={r['octaves']} {r['colormap']} "
+              f"{r['baseline_wall_s'] * 1000:.1f} ms -> {r['wall_s'] * 1000:.1f} ms ({r['ratio']:.2f}x)")
+    print(f"结果已保存到 {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+方框统计（exp2）
+
+每张噪声场只建一次积分图（summed-area table），之后任意方框的均值、方差都是 O(1)；
+同一尺寸方框的最小/最大值用可分离的滑动窗口滤波预计算一次，查询同样是 O(1)。
+所有查询都接受数组，成千上万个方框一次向量化完成。
+
+sample_box_pairs 一次批量抽取大量不重叠的方框对，可指定目标均值差来控制难度。
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from scipy.ndimage import maximum_filter, minimum_filter
+
+import instrument
+
+
+class BoxStats:
+    def __init__(self, field):
+        field = np.asarray(field, dtype=np.float64)
+        self.field = field
+        self.shape = field.shape
+        # 左上各补一行/列 0，box 和 = S[y1,x1] - S[y0,x1] - S[y1,x0] + S[y0,x0]
+        self._sum = np.zeros((field.shape[0] + 1, field.shape[1] + 1))
+        self._sum[1:, 1:] = field.cumsum(0).cumsum(1)
+        self._sum_sq = np.zeros_like(self._sum)
+        self._sum_sq[1:, 1:] = (field * field).cumsum(0).cumsum(1)
+        self._extrema = lru_cache(maxsize=8)(self._window_extrema)
+
+    def _box_sum(self, table, x, y, width, height):
+        x = np.asarray(x)
+        y = np.asarray(y)
+        return table[y + height, x + width] - table[y, x + width] - table[y + height, x] + table[y, x]
+
+    def mean(self, x, y, width=100, height=100):
+        """(x, y) 为左上角（列、行），与 noise[y:y+height, x:x+width] 对应"""
+        return self._box_sum(self._sum, x, y, width, height) / (width * height)
+
+    def var(self, x, y, width=100, height=100):
+        n = width * height
+        mean = self._box_sum(self._sum, x, y, width, height) / n
+        return np.maximum(self._box_sum(self._sum_sq, x, y, width, height) / n - mean * mean, 0)
+
+    def _window_extrema(self, width, height):
+        # origin 平移后，结果 [y, x] 对应以 (x, y) 为左上角的窗口
+        origin = (-(height // 2), -(width // 2))
+        size = (height, width)
+        lo = minimum_filter(self.field, size=size, origin=origin, mode='nearest')
+        hi = maximum_filter(self.field, size=size, origin=origin, mode='nearest')
+        return lo, hi
+
+    def min(self, x, y, width=100, height=100):
+        return self._extrema(width, height)[0][np.asarray(y), np.asarray(x)]
+
+    def max(self, x, y, width=100, height=100):
+        return self._extrema(width, height)[1][np.asarray(y), np.asarray(x)]
+
+
+def boxes_overlap(x1, y1, x2, y2, size=100):
+    """两组同尺寸方框是否重叠（与 exp2 原来的判断条件相同）"""
+    return (x1 < x2 + size) & (x1 + size > x2) & (y1 < y2 + size) & (y1 + size > y2)
+
+
+@instrument.timed('box_pairs')
+def sample_box_pairs(stats, n_pairs, size=100, margin=30, rng=None,
+                     target_diff=None, tolerance=0.02, balance=True, max_rounds=100):
+    """
+    批量抽取 n_pairs 对不重叠的 size×size 方框，方框离边界至少 margin。
+    - target_diff: 两框均值差的目标绝对值（越小越难），None 表示不限制
+    - tolerance:   允许的偏差 |diff - target_diff| <= tolerance
+    - balance:     让一半的对是第一个框均值更大，另一半是第二个框更大
+    返回 dict，各项为长度 n_pairs 的数组：x1, y1, x2, y2, mean1, mean2
+    """
+    rng = np.random.default_rng(rng)
+    height, width = stats.shape
+    x_hi, y_hi = width - size - margin, height - size - margin
+    if x_hi < margin or y_hi < margin:
+        raise ValueError(f"噪声场 {stats.shape} 太小，放不下 {size}x{size} 的方框")
+    # 两框不重叠要求左上角在 x 或 y 方向上至少相差 size，否则无论抽多少轮都找不到
+    if x_hi - margin < size and y_hi - margin < size:
+        raise ValueError(f"噪声场 {stats.shape} 太小，放不下两个不重叠的 {size}x{size} 方框（边距 {margin}）")
+
+    picked = {key: [] for key in ('x1', 'y1', 'x2', 'y2', 'mean1', 'mean2')}
+    count = 0
+    for _ in range(max_rounds):
+        batch = max(4 * (n_pairs - count), 256)
+        x1, x2 = rng.integers(margin, x_hi + 1, size=(2, batch))
+        y1, y2 = rng.integers(margin, y_hi + 1, size=(2, batch))
+        keep = ~boxes_overlap(x1, y1, x2, y2, size)
+        mean1 = stats.mean(x1, y1, size, size)
+        mean2 = stats.mean(x2, y2, size, size)
+        if target_diff is not None:
+            keep &= np.abs(np.abs(mean1 - mean2) - target_diff) <= tolerance
+        take = np.flatnonzero(keep)[:n_pairs - count]
+        for key, values in zip(picked, (x1, y1, x2, y2, mean1, mean2)):
+            picked[key].append(values[take])
+        count += take.size
+        if count >= n_pairs:
+            break
+    else:
+        hint = "，请放宽 target_diff / tolerance" if target_diff is not None else ""
+        raise RuntimeError(f"{max_rounds} 轮内只找到 {count}/{n_pairs} 对满足条件的方框{hint}")
+
+    pairs = {key: np.concatenate(values) for key, values in picked.items()}
+    if balance:
+        # 随机挑一半的对让第一个框更大，其余让第二个框更大
+        want_first = np.zeros(n_pairs, dtype=bool)
+        want_first[rng.permutation(n_pairs)[:n_pairs // 2]] = True
+        swap = (pairs['mean1'] > pairs['mean2']) != want_first
+        for a, b in (('x1', 'x2'), ('y1', 'y2'), ('mean1', 'mean2')):
+            pairs[a][swap], pairs[b][swap] = pairs[b][swap], pairs[a][swap]
+    return pairs
@@ -0,0 +1,252 @@
+"""
+实验的增量构建图（buildgraph.py）
+
+噪声场 (.npy) -> 标量场 PNG / 带 colorbar 的图 / 染色 Excel
+            -> exp2 方框刺激图、exp3 剖面刺激图
+            -> 模型作答（可选，需要网络）-> 答案文件 (result/model/<colormap>.txt)
+作答记录 (result/<n>/<colormap>.txt，以及上面的模型答案) + 噪声场 -> findvalue 结果 -> 汇总报表
+
+改一个参数后直接重跑本脚本：只有受影响的产物会重建，其余全部跳过，
+互不依赖的产物在进程池中并行构建。
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+CODES_DIR = os.path.dirname(os.path.abspath(__file__))
+for _sub in ('exp1', 'exp2', 'exp3'):
+    sys.path.append(os.path.join(CODES_DIR, _sub))
+
+import instrument
+from buildgraph import BuildGraph
+from excelwriter import save_colored_excel
+from fieldstore import FieldStore
+from raster import save_scalar_field_png
+from sweep import build_jobs, field_name, field_tag, generate_job_noise
+
+PROJECT_DIR = os.path.dirname(CODES_DIR)
+
+
+# ---------- 各类产物的构建函数（模块级，可在子进程中执行） ----------
+def build_field(store_dir, name, shape, res, octaves, persistence, entropy, spawn_key, engine='perlin'):
+    job = {'shape': tuple(shape), 'res': tuple(res), 'octaves': octaves, 'persistence': persistence,
+           'seed': np.random.SeedSequence(entropy, spawn_key=tuple(spawn_key)), 'engine': engine}
+    FieldStore(store_dir).save(name, generate_job_noise(job), shape=tuple(shape), res=tuple(res),
+                               octaves=octaves, persistence=persistence, seed=job['seed'], engine=engine)
+
+
+def build_scalar_png(field_path, colormap, output):
+    save_scalar_field_png(np.load(field_path, mmap_mode='r'), colormap, output)
+
+
+def build_colorbar(field_path, colormap, res, output):
+    from exp1makepic import plot_colorbar_field
+    plot_colorbar_field(np.load(field_path, mmap_mode='r'), colormap, tuple(res), output)
+
+
+def build_excel(field_path, colormap, output):
+    save_colored_excel(np.load(field_path), output, colormap)
+
+
+def build_box_stimuli(field_path, field_name, colormap, output_filepath, result_file, box_count, seed):
+    from exp2makepic import generate_image_with_boxes_and_compare
+    open(result_file, 'w').close()  # 该函数以追加方式写结果
+    generate_image_with_boxes_and_compare(np.load(field_path, mmap_mode='r'), colormap, output_filepath,
+                                          result_file, box_count=box_count, rng=seed)
+
+
+def build_profile_stimuli(field_path, field_name, colormap, rounds, output_dir, result_file, corr_band, seed):
+    from compositor import render_base
+    from exp3makepic import generate_profile_round
+    from profiles import ProfileIndex
+    index = ProfileIndex(np.load(field_path, mmap_mode='r'), length=351, margin=30)
+    base = render_base(index.field, colormap)
+    rng = np.random.default_rng(seed)
+    with open(result_file, 'w') as f:
+        for i in range(1, rounds + 1):
+            profiles_filepath, real_index, _, _ = generate_profile_round(
+                index, field_name, colormap, i, output_dir, rng, tuple(corr_band), base=base)
+            f.write(f"{os.path.basename(profiles_filepath)} + 真实曲线是第 {real_index + 1} 条\n")
+
+
+def build_model_answers(images, prompt, model, output):
+    from gpteval import EvalClient, build_messages, encode_image
+    from responsecache import ResponseCache
+    if not os.environ.get("OPENAI_API_KEY"):
+        raise RuntimeError("模型作答需要环境变量 OPENAI_API_KEY（或把 query_model 设为 False）")
+    client = EvalClient(model=model, concurrency=8, rate=5, cache=ResponseCache())
+    requests = ((os.path.basename(path), build_messages(prompt, encode_image(path))) for path in images)
+    results, errors = client.evaluate(requests)
+    if errors:
+        raise RuntimeError(f"{len(errors)} 张图片作答失败: {sorted(errors)[:3]}")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=1)
+
+
+def build_answer_file(answers_json, images, output):
+    """模型回答（{文件名: 回答}）-> findvalue 的答案文件：Image k 对应第 k 张图（第 k 张噪声场）"""
+    from resultstore import parse_coordinate_answer
+    with open(answers_json, 'r', encoding='utf-8') as f:
+        answers = json.load(f)
+    with open(output, 'w', encoding='utf-8') as f:
+        for k, path in enumerate(images, start=1):
+            f.write(f"Image {k}\n")
+            for target, x, y in parse_coordinate_answer(answers.get(os.path.basename(path), '')):
+                f.write(f"{target}: ({x}, {y})\n")
+
+
+def build_findvalue(answer_file, csv_mapping, output, log_file, results_db, folder, colormap):
+    from findvalue import process_coordinates
+    from resultstore import ResultStore
+    # 与直接运行 findvalue 一样，每个点同时写入结果库
+    with ResultStore(results_db) as results:
+        process_coordinates(answer_file, csv_mapping, output, log_file, results=results,
+                            folder=folder, colormap=colormap)
+
+
+def build_report(result_root, output_dir, folders):
+    from txtreport import collect_from_files, report_tables, write_csv, write_workbook
+    tables = report_tables(collect_from_files(result_root, folders=folders))
+    for name, matrix in tables.items():
+        write_csv(os.path.join(output_dir, f'{name}.csv'), matrix)
+    write_workbook(os.path.join(output_dir, 'report.xlsx'), tables)
+
+
+# ---------- 图 ----------
+def experiment_graph(config):
+    """按 config 定义整个实验的构建图（路径均为绝对路径，状态文件才稳定）"""
+    root = config['project_dir']
+    uncolor_dir = os.path.join(root, 'data', 'uncolor')
+    colored_dir = os.path.join(root, 'data', 'colored')
+    result_root = os.path.join(root, 'result')
+    graph = BuildGraph(os.path.join(root, 'data', 'build', 'state.json'))
+
+    jobs = build_jobs(config['shape'], config['res_list'], config['octaves_list'], config['persistence_list'],
+                      colormap_list=config['colormaps'], seed=config['seed'], engine=config['engine'])
+    field_paths = {}
+    pngs = {cm: [] for cm in config['colormaps']}
+    for job in jobs:
+        shape, res, octaves = job['shape'], job['res'], job['octaves']
+        name, tag = field_name(job), field_tag(job)
+        field_path = os.path.join(uncolor_dir, name + '.npy')
+        field_paths[name] = field_path
+        field = graph.add(f"field:{name}", build_field,
+                          outputs=[field_path, os.path.join(uncolor_dir, name + '.json')],
+                          params={'store_dir': uncolor_dir, 'name': name, 'shape': list(shape), 'res': list(res),
+                                  'octaves': octaves, 'persistence': job['persistence'],
+                                  'entropy': job['seed'].entropy, 'spawn_key': list(job['seed'].spawn_key),
+                                  'engine': job['engine']})
+
+        for cm in config['colormaps']:
+            image_dir = os.path.join(root, 'color', cm)
+            png = os.path.join(image_dir, f"ScalarField_{cm}_{tag}.png")
+            pngs[cm].append(png)
+            graph.add(f"png:{cm}:{name}", build_scalar_png, outputs=[png], deps=[field],
+                      params={'field_path': field_path, 'colormap': cm, 'output': png})
+            colorbar = os.path.join(image_dir, f"Colorbar_{cm}_{tag}.png")
+            graph.add(f"colorbar:{cm}:{name}", build_colorbar, outputs=[colorbar], deps=[field],
+                      params={'field_path': field_path, 'colormap': cm, 'res': list(res), 'output': colorbar})
+            excel = os.path.join(colored_dir, f"Colored_{cm}_{tag}.xlsx")
+            graph.add(f"excel:{cm}:{name}", build_excel, outputs=[excel], deps=[field],
+                      params={'field_path': field_path, 'colormap': cm, 'output': excel})
+
+            # exp2：每张噪声场 × colormap 一组方框刺激图
+            exp2_dir = os.path.join(root, 'color', 'exp2', cm)
+            boxes = os.path.join(exp2_dir, f"ScalarField_WithBoxes_{name}_{cm}.png")
+            box_count = config['box_count']
+            graph.add(f"exp2:{cm}:{name}", build_box_stimuli,
+                      outputs=[boxes.replace(".png", f"_{i + 1}.png") for i in range(box_count)]
+                      + [os.path.join(exp2_dir, f"result_{name}.txt")], deps=[field],
+                      params={'field_path': field_path, 'field_name': name, 'colormap': cm,
+                              'output_filepath': boxes, 'result_file': os.path.join(exp2_dir, f"result_{name}.txt"),
+                              'box_count': box_count, 'seed': [config['seed'], job['index']]})
+
+            # exp3：每张噪声场 × colormap 若干轮剖面刺激图
+            exp3_dir = os.path.join(root, 'color', 'exp3', cm)
+            rounds = config['profile_rounds']
+            outputs = [os.path.join(exp3_dir, f"{kind}_{name}_{cm}_{i}.png")
+                       for i in range(1, rounds + 1) for kind in ('ScalarField', 'Profiles')]
+            graph.add(f"exp3:{cm}:{name}", build_profile_stimuli,
+                      outputs=outputs + [os.path.join(exp3_dir, f"result_{name}.txt")], deps=[field],
+                      params={'field_path': field_path, 'field_name': name, 'colormap': cm, 'rounds': rounds,
+                              'output_dir': exp3_dir, 'result_file': os.path.join(exp3_dir, f"result_{name}.txt"),
+                              'corr_band': list(config['corr_band']), 'seed': [config['seed'], job['index']]})
+
+    # findvalue：作答记录是外部输入（源节点），Image k 对应第 k 张噪声场
+    csv_mapping = {str(k + 1): path for k, path in enumerate(field_paths.values())}
+    field_nodes = [f"field:{name}" for name in field_paths]
+    findvalue_nodes = []
+
+    def add_findvalue(folder, cm, answer_node, answer_file):
+        output = os.path.join(result_root, folder, f"{cm}_result.txt")
+        findvalue_nodes.append(graph.add(
+            f"findvalue:{folder}:{cm}", build_findvalue, outputs=[output], deps=[answer_node] + field_nodes,
+            params={'answer_file': answer_file, 'csv_mapping': csv_mapping, 'output': output,
+                    'log_file': os.path.join(root, 'error_log.txt'),
+                    'results_db': os.path.join(root, 'data', 'results.sqlite'), 'folder': folder, 'colormap': cm}))
+
+    folders = sorted((d for d in os.listdir(result_root) if d.isdigit()), key=int) if os.path.isdir(result_root) else []
+    for folder in folders:
+        for cm in config['colormaps']:
+            answer_file = os.path.join(result_root, folder, f"{cm}.txt")
+            if os.path.exists(answer_file):
+                add_findvalue(folder, cm, graph.source(f"answer:{folder}:{cm}", [answer_file]), answer_file)
+
+    # 模型作答（需要网络和 API key，默认关闭）：回答转成答案文件，同样经 findvalue 进入汇总报表
+    if config['query_model']:
+        model_dir = os.path.join(result_root, 'model')
+        for cm in config['colormaps']:
+            answers = os.path.join(model_dir, f"{cm}_answers.json")
+            prompt = config['prompt'].format(width=config['shape'][1], height=config['shape'][0], colormap=cm)
+            graph.add(f"answers:{cm}", build_model_answers, outputs=[answers],
+                      deps=[f"png:{cm}:{name}" for name in field_paths],
+                      params={'images': pngs[cm], 'prompt': prompt, 'model': config['model'], 'output': answers})
+            answer_file = os.path.join(model_dir, f"{cm}.txt")
+            graph.add(f"answer:model:{cm}", build_answer_file, outputs=[answer_file], deps=[f"answers:{cm}"],
+                      params={'answers_json': answers, 'images': pngs[cm], 'output': answer_file})
+            add_findvalue('model', cm, f"answer:model:{cm}", answer_file)
+        folders = folders + ['model']
+
+    if findvalue_nodes:
+        from txtreport import COLORMAPS
+        report_dir = os.path.join(result_root, 'data')
+        graph.add("report", build_report,
+                  outputs=[os.path.join(report_dir, f"{name}.csv") for cm in COLORMAPS for name in (cm, f"{cm}_diff")]
+                  + [os.path.join(report_dir, 'report.xlsx')],
+                  deps=findvalue_nodes, params={'result_root': result_root, 'output_dir': report_dir,
+                                                'folders': folders})
+    return graph
+
+
+def main():
+    config = {
+        'project_dir': PROJECT_DIR,
+        'shape': (630, 820),
+        'res_list': [(1, 1), (3, 3), (5, 5), (7, 7), (9, 9)],
+        'octaves_list': [5],
+        'persistence_list': [0.5],
+        'colormaps': ['gray', 'rainbow', 'hot'],
+        'seed': 0,
+        'engine': 'perlin',  # 'perlin'、'perlin_fused' 或 'spectral'
+        'box_count': 8,
+        'profile_rounds': 3,
+        'corr_band': (-1.0, 0.95),
+        'query_model': False,
+        'model': 'gpt-4o',
+        'prompt': "The image has dimensions of {width}x{height} and uses the '{colormap}' colormap. "
+                  "The data has been normalized. Please identify and mark points on the image corresponding "
+                  "to the data values 1.0, 0.8, 0.6, 0.4, and 0.2. Provide the coordinates of the marked points. "
+                  "Only one point should be provided for each value. "
+                  "Please limit the output coordinate format to 1.0: (200, 150).",
+    }
+    workers = None  # 进程数，None 表示使用全部 CPU
+    with instrument.run('buildexp'):
+        graph = experiment_graph(config)
+        graph.build(workers=workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+增量构建图：每个产物（节点）声明自己的输入节点、参数和输出文件，
+只重建过期的节点，互不依赖的节点在进程池中并行构建。
+
+节点指纹 = SHA-256(节点名, 构建函数, 版本号, 参数, 所有输入节点输出文件的内容哈希)。
+以下情况节点需要重建：
+- 从未构建过，或指纹变了（参数 / 代码版本 / 上游输出内容有变化）
+- 输出文件缺失，或内容被改动过
+上游重建后若输出内容完全相同，下游指纹不变，不会跟着重建。
+状态保存在一个 JSON 文件里；文件哈希按 (大小, 修改时间) 记忆，未改动的大文件不必重新读取。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import instrument
+from fieldcache import file_digest
+
+
+class Node:
+    def __init__(self, name, func, outputs=(), deps=(), params=None, version=1):
+        """
+        func(**params) 负责写出 outputs 里的所有文件；func 为 None 表示源节点
+        （外部提供的输入文件，如作答记录），只计算内容哈希。
+        func 需为模块级函数，才能交给进程池执行。
+        """
+        self.name = name
+        self.func = func
+        self.outputs = [os.path.normpath(p) for p in outputs]
+        self.deps = list(deps)
+        self.params = params or {}
+        self.version = version
+
+    def func_id(self):
+        if self.func is None:
+            return None
+        return f"{self.func.__module__}.{self.func.__qualname__}"
+
+
+def _run_node(func, params):
+    start = time.perf_counter()
+    with instrument.stage(func.__name__):
+        func(**params)
+    return time.perf_counter() - start
+
+
+class BuildGraph:
+    def __init__(self, state_path):
+        self.state_path = state_path
+        self.nodes = {}
+        self._state = {'nodes': {}, 'files': {}}
+        if os.path.exists(state_path):
+            with open(state_path, 'r', encoding='utf-8') as f:
+                self._state = json.load(f)
+
+    # ---------- 定义 ----------
+    def add(self, name, func, outputs=(), deps=(), params=None, version=1):
+        if name in self.nodes:
+            raise ValueError(f"节点重复: {name}")
+        for dep in deps:
+            if dep not in self.nodes:
+                raise ValueError(f"节点 {name} 依赖的 {dep} 尚未定义")
+        self.nodes[name] = Node(name, func, outputs, deps, params, version)
+        return name
+
+    def source(self, name, paths):
+        """外部输入文件（不由本图生成）"""
+        return self.add(name, None, outputs=paths)
+
+    # ---------- 指纹 ----------
+    def _file_digest(self, path):
+        stat = os.stat(path)
+        cached = self._state['files'].get(path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = file_digest(path)
+        self._state['files'][path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def _output_digests(self, node):
+        return {path: self._file_digest(path) for path in node.outputs}
+
+    def fingerprint(self, node, dep_digests):
+        payload = {
+            'name': node.name, 'func': node.func_id(), 'version': node.version,
+            'params': node.params, 'inputs': {dep: dep_digests[dep] for dep in node.deps},
+        }
+        text = json.dumps(payload, sort_keys=True, default=repr, ensure_ascii=False)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _up_to_date(self, node, fingerprint):
+        record = self._state['nodes'].get(node.name)
+        if record is None or record['fingerprint'] != fingerprint:
+            return False
+        for path in node.outputs:
+            if not os.path.exists(path) or self._file_digest(path) != record['outputs'].get(path):
+                return False
+        return True
+
+    def _save_state(self):
+        # 先写临时文件再改名，构建中途被打断也不会留下半个状态文件
+        folder = os.path.dirname(os.path.abspath(self.state_path))
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    # ---------- 构建 ----------
+    def _closure(self, targets):
+        needed, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.nodes[name].deps)
+        return needed
+
+    def build(self, targets=None, workers=None, force=False):
+        """
+        构建 targets（默认全部）及其所有上游节点。
+        workers=1 时在当前进程内顺序执行。force=True 时忽略指纹全部重建（源节点除外）。
+        返回 {'built': [...], 'skipped': [...], 'failed': {节点: 异常}, 'blocked': [...]}
+        """
+        pending = self._closure(targets if targets is not None else list(self.nodes))
+        digests = {}  # 已完成节点的输出哈希
+        summary = {'built': [], 'skipped': [], 'failed': {}, 'blocked': []}
+        running = {}
+        fingerprints = {}
+        start = time.perf_counter()
+        if workers is None:
+            workers = os.cpu_count() or 1
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        run_node = instrument.worker(_run_node)  # 开启运行记录时，子进程的记录随结果带回
+
+        def finish(name, error=None, elapsed=0.0):
+            node = self.nodes[name]
+            if error is None:
+                missing = [p for p in node.outputs if not os.path.exists(p)]
+                if missing:
+                    error = FileNotFoundError(f"{name} 没有生成: {missing}")
+            if error is not None:
+                summary['failed'][name] = error
+                print(f"❌ {name}: {error}")
+                return
+            digests[name] = self._output_digests(node)
+            if node.func is not None:
+                self._state['nodes'][name] = {'fingerprint': fingerprints[name], 'outputs': digests[name],
+                                              'built': time.time(), 'seconds': round(elapsed, 3)}
+                self._save_state()
+                summary['built'].append(name)
+                print(f"✅ {name} ({elapsed:.2f}s)")
+
+        try:
+            while pending or running:
+                progressed = False
+                for name in sorted(pending):
+                    node = self.nodes[name]
+                    if any(dep in summary['failed'] or dep in summary['blocked'] for dep in node.deps):
+                        pending.discard(name)
+                        summary['blocked'].append(name)
+                        progressed = True
+                        continue
+                    if not all(dep in digests for dep in node.deps):
+                        continue
+                    pending.discard(name)
+                    progressed = True
+
+                    if node.func is None:
+                        missing = [p for p in node.outputs if not os.path.exists(p)]
+                        finish(name, FileNotFoundError(f"缺少输入文件: {missing}") if missing else None)
+                        continue
+                    fingerprints[name] = self.fingerprint(node, digests)
+                    if not force and self._up_to_date(node, fingerprints[name]):
+                        digests[name] = self._state['nodes'][name]['outputs']
+                        summary['skipped'].append(name)
+                        continue
+                    for path in node.outputs:
+                        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                    if pool is None:
+                        try:
+                            elapsed = _run_node(node.func, node.params)
+                        except Exception as e:
+                            finish(name, e)
+                        else:
+                            finish(name, elapsed=elapsed)
+                    else:
+                        running[pool.submit(run_node, node.func, node.params)] = name
+
+                if running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        try:
+                            elapsed = instrument.unwrap(future.result(), node=name)
+                        except Exception as e:
+                            finish(name, e)
+                        else:
+                            finish(name, elapsed=elapsed)
+                elif not progressed:
+                    break
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            self._save_state()
+
+        elapsed = time.perf_counter() - start
+        print(f"构建完成：重建 {len(summary['built'])}，跳过 {len(summary['skipped'])}，"
+              f"失败 {len(summary['failed'])}，受阻 {len(summary['blocked'])}，用时 {elapsed:.1f}s")
+        return summary
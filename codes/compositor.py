@@ -0,0 +1,102 @@
+"""
+刺激图合成：每张噪声场 × 每种 colormap 只栅格化一次底图，
+方框（exp2）和 A/B 标记点（exp3）直接画进底图的像素副本里，
+所以每多一张刺激图基本只多一次 PNG 编码。
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import matplotlib.colors as mcolors
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import instrument
+from raster import render_scalar_field, write_png
+
+
+def color_rgb(color):
+    """matplotlib 颜色名（'red'、'purple' 等）-> uint8 RGB"""
+    return np.array([round(c * 255) for c in mcolors.to_rgb(color)], dtype=np.uint8)
+
+
+@instrument.timed('render_base')
+def render_base(noise, colormap):
+    """底图 (H, W, 3)，与 raster.save_scalar_field_png 输出的像素相同"""
+    return render_scalar_field(noise, colormap)
+
+
+def stamp_box(pixels, x, y, width, height, color, thickness=3):
+    """
+    原地画矩形边框，(x, y) 为左上角（列、行），边线以矩形边界为中心，
+    与 plt.Rectangle 的画法一致；超出图像的部分被裁掉。
+    """
+    rgb = color_rgb(color)
+    h, w = pixels.shape[:2]
+    lo = thickness // 2
+    hi = thickness - lo
+
+    def fill(r0, r1, c0, c1):
+        r0, r1 = max(r0, 0), min(r1, h)
+        c0, c1 = max(c0, 0), min(c1, w)
+        if r0 < r1 and c0 < c1:
+            pixels[r0:r1, c0:c1] = rgb
+
+    fill(y - lo, y + hi, x - lo, x + width + hi)                     # 上边
+    fill(y + height - lo, y + height + hi, x - lo, x + width + hi)   # 下边
+    fill(y - lo, y + height + hi, x - lo, x + hi)                    # 左边
+    fill(y - lo, y + height + hi, x + width - lo, x + width + hi)    # 右边
+    return pixels
+
+
+def _blend(pixels, top, left, alpha, rgb):
+    """按 alpha (0~1) 把纯色混合进 pixels[top:, left:]，自动裁剪到图像内"""
+    h, w = pixels.shape[:2]
+    ah, aw = alpha.shape
+    r0, c0 = max(top, 0), max(left, 0)
+    r1, c1 = min(top + ah, h), min(left + aw, w)
+    if r0 >= r1 or c0 >= c1:
+        return pixels
+    a = alpha[r0 - top:r1 - top, c0 - left:c1 - left, None]
+    region = pixels[r0:r1, c0:c1]
+    region[...] = np.rint(region * (1 - a) + rgb * a).astype(np.uint8)
+    return pixels
+
+
+@lru_cache(maxsize=None)
+def disk_mask(radius):
+    r = np.arange(-radius, radius + 1)
+    return ((r[:, None] ** 2 + r[None, :] ** 2) <= radius ** 2).astype(np.float64)
+
+
+@lru_cache(maxsize=None)
+def text_mask(text, fontsize=12, dpi=150):
+    """用 Agg 把文字渲染一次，裁成紧凑的 alpha 遮罩后缓存复用"""
+    size = fontsize * 3 / 72
+    fig = Figure(figsize=(size * max(len(text), 1), size), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    fig.text(0.5, 0.5, text, fontsize=fontsize, color='black', ha='center', va='center')
+    canvas.draw()
+    gray = np.asarray(canvas.buffer_rgba())[..., 0]
+    alpha = (255 - gray.astype(np.float64)) / 255
+    rows = np.flatnonzero(alpha.max(axis=1) > 0)
+    cols = np.flatnonzero(alpha.max(axis=0) > 0)
+    if rows.size == 0:
+        return np.zeros((0, 0))
+    return alpha[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+
+
+def stamp_point(pixels, x, y, color, radius=4):
+    """原地画实心圆点（对应 plt.scatter(..., s=20)）"""
+    return _blend(pixels, y - radius, x - radius, disk_mask(radius), color_rgb(color))
+
+
+def stamp_label(pixels, x, y, text, color, fontsize=12):
+    """原地写文字，水平居中于 x，文字底边在 y（对应 ha='center', va='bottom'）"""
+    alpha = text_mask(text, fontsize)
+    return _blend(pixels, y - alpha.shape[0], x - alpha.shape[1] // 2, alpha, color_rgb(color))
+
+
+def save(pixels, target):
+    """写出 PNG（路径或文件对象）"""
+    return write_png(pixels, target)
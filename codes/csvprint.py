@@ -1,38 +1,10 @@
 import numpy as np
-import openpyxl
-from openpyxl.styles import PatternFill
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
 
-# colored Excel
-def save_colored_excel(data, filepath, colormap_name):
-    # Normalize the data to [0, 1]
-    data_normalized = (data - data.min()) / (data.max() - data.min())
-
-    #colormap
-    cmap = plt.get_cmap(colormap_name)
-    norm = mcolors.Normalize(vmin=0, vmax=1)
-
-    #Excel workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Colored Data"
-
-    # Write data with dynamic colormap-based coloring
-    for i, row in enumerate(data_normalized, start=1):
-        for j, value in enumerate(row, start=1):
-            cell = ws.cell(row=i, column=j, value=value)
+import excelwriter
 
-            # Convert value to RGB color using the colormap
-            rgba = cmap(norm(value))
-            rgb = tuple(int(255 * c) for c in rgba[:3])  # Extract RGB from RGBA
-            hex_color = "{:02X}{:02X}{:02X}".format(*rgb)  # Convert to HEX
-
-            # Apply the color as cell background
-            cell.fill = PatternFill(start_color=hex_color, end_color=hex_color, fill_type="solid")
-
-    # Save the workbook
-    wb.save(filepath)
+# colored Excel（向量化查表 + 流式写出，见 excelwriter.py）
+def save_colored_excel(data, filepath, colormap_name):
+    excelwriter.save_colored_excel(data, filepath, colormap_name, sheet_title="Colored Data")
     print(f"Excel file saved to: {filepath}")
 
 """
@@ -0,0 +1,135 @@
+"""
+染色 Excel 写出（makeimg.py / exp1 / csvprint.py 共用）
+
+旧写法对每个单元格调用一次 cmap(norm(value)) 并新建一个 PatternFill，
+约 52 万个单元格要几分钟、占用几 GB 内存。这里：
+- 整个数组一次性映射到 colormap 查找表（与 matplotlib 的取色规则相同，颜色逐格一致）
+- 调色板有上限（默认即 colormap 的 N 个颜色），相同颜色只生成一个填充样式，所有单元格共享
+- 工作表 XML 逐行流式写入 xlsx（zip），内存不随行数增长
+"""
+
+import zipfile
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+import matplotlib.pyplot as plt
+from openpyxl.utils import get_column_letter
+
+import instrument
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+CONTENT_TYPES = XML_DECL + (
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+ROOT_RELS = XML_DECL + (
+    f'<Relationships xmlns="{PKG_REL_NS}">'
+    f'<Relationship Id="rId1" Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+WORKBOOK_RELS = XML_DECL + (
+    f'<Relationships xmlns="{PKG_REL_NS}">'
+    f'<Relationship Id="rId1" Type="{REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+    f'<Relationship Id="rId2" Type="{REL_NS}/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+
+def colormap_palette(colormap, levels=None):
+    """
+    colormap 的查找表，返回 (N, rgb)，rgb 为 (N, 3) 的 0~255 整数。
+    取整方式与旧代码 int(255 * c) 相同；levels 可把调色板量化到更少的颜色。
+    """
+    cmap = plt.get_cmap(colormap)
+    if levels is not None:
+        cmap = cmap.resampled(levels)
+    rgb = (cmap(np.arange(cmap.N))[:, :3] * 255).astype(int)
+    return cmap.N, rgb
+
+
+def palette_indices(noise, n):
+    """[0, 1] 的数据映射到 0..n-1 的调色板下标（matplotlib Colormap.__call__ 的规则）"""
+    idx = noise * n
+    idx[idx == n] = n - 1
+    np.clip(idx, 0, n - 1, out=idx)
+    return idx.astype(np.intp)
+
+
+def styles_xml(hex_colors):
+    """每个颜色一个实心填充 + 一个 cellXfs 条目；cellXfs[0] 为默认样式"""
+    fills = ''.join(
+        f'<fill><patternFill patternType="solid"><fgColor rgb="00{c}"/><bgColor rgb="00{c}"/>'
+        f'</patternFill></fill>' for c in hex_colors
+    )
+    xfs = ''.join(
+        f'<xf numFmtId="0" fontId="0" fillId="{k + 2}" borderId="0" xfId="0" applyFill="1"/>'
+        for k in range(len(hex_colors))
+    )
+    return XML_DECL + (
+        f'<styleSheet xmlns="{MAIN_NS}">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        f'<fills count="{len(hex_colors) + 2}">'
+        '<fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill>'
+        f'{fills}</fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        f'<cellXfs count="{len(hex_colors) + 1}"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        f'{xfs}</cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    )
+
+
+def workbook_xml(sheet_title):
+    return XML_DECL + (
+        f'<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}">'
+        f'<sheets><sheet name={quoteattr(sheet_title)} sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+@instrument.timed('excel', output='filepath')
+def save_colored_excel(noise, filepath, colormap, sheet_title="Elevation Data", levels=None):
+    """
+    归一化后写出染色 Excel：单元格值为归一化后的数值，背景色取自 colormap。
+    levels: 调色板颜色数上限（默认用 colormap 自身的 N，颜色与旧实现逐格一致）
+    """
+    # Normalize
+    noise = (noise - noise.min()) / (noise.max() - noise.min())
+
+    # 整个数组一次查表，再把重复的颜色合并成同一个样式
+    n, rgb = colormap_palette(colormap, levels)
+    hex_colors = np.array(["{:02X}{:02X}{:02X}".format(*c) for c in rgb])
+    unique_colors, style_of_entry = np.unique(hex_colors, return_inverse=True)
+    style_ids = style_of_entry[palette_indices(noise, n)] + 1  # 0 为默认样式
+
+    columns = [get_column_letter(j) for j in range(1, noise.shape[1] + 1)]
+    with zipfile.ZipFile(filepath, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', CONTENT_TYPES)
+        zf.writestr('_rels/.rels', ROOT_RELS)
+        zf.writestr('xl/workbook.xml', workbook_xml(sheet_title))
+        zf.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS)
+        zf.writestr('xl/styles.xml', styles_xml(unique_colors))
+
+        # 逐行流式写入，每行拼好一个字符串再写
+        with zf.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write((XML_DECL + f'<worksheet xmlns="{MAIN_NS}"><sheetData>').encode('utf-8'))
+            for i, (values, styles) in enumerate(zip(noise, style_ids), start=1):
+                cells = ''.join(
+                    f'<c r="{col}{i}" s="{s}"><v>{v!r}</v></c>'
+                    for col, v, s in zip(columns, values.tolist(), styles.tolist())
+                )
+                sheet.write(f'<row r="{i}">{cells}</row>'.encode('utf-8'))
+            sheet.write(b'</sheetData></worksheet>')
@@ -1,6 +1,13 @@
 import os
 import re
-import pandas as pd
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import instrument
+from fieldstore import field_exists, lazy_field, open_field
+from resultstore import ResultStore
 
 
 def clean_zero_width_spaces(text):
@@ -8,27 +15,18 @@ def clean_zero_width_spaces(text):
     return re.sub(r'[\u200B\u200C\u200D\uFEFF]', '', text)
 
 
-def process_coordinates(txt_file, csv_mapping, output_txt, log_file):
+def parse_answer_file(txt_file):
     """
-    处理坐标文件，生成结果并记录异常日志。
-    x为行，y为列
+    把整个答案文件解析成数组：每个坐标行一项，按出现顺序排列。
+    返回 (labels, images, xs, ys)，images 中没有 Image 标题时为 None。
     """
-    # 读取文本文件 (坐标信息)
-    if not os.path.exists(txt_file):
-        with open(log_file, 'a', encoding='utf-8') as log:
-            log.write(f"Error: Coordinate file not found - {txt_file}\n")
-        print(f"❌ Error: Coordinate file not found - {txt_file}")
-        return
-
     with open(txt_file, 'r', encoding='utf-8') as f:
         lines = f.readlines()
 
-    all_results = []  # 保存处理后的结果
+    labels, images, xs, ys = [], [], [], []
     current_image = None  # 当前 Image 编号
-
     for line in lines:
-        line = clean_zero_width_spaces(line)
-        line_stripped = line.strip()
+        line_stripped = clean_zero_width_spaces(line).strip()
 
         # 匹配 "Image 1", "Image 2" 等
         match_img = re.match(r'^Image\s+(\d+):?$', line_stripped)
@@ -40,50 +38,136 @@ def process_coordinates(txt_file, csv_mapping, output_txt, log_file):
         match_coord = re.match(r'^([\d\.]+):\s*\((\d+)\s*,\s*(\d+)\)$', line_stripped)
         if match_coord:
             float_value, x_str, y_str = match_coord.groups()
-            x, y = int(x_str), int(y_str)
+            labels.append(float_value)
+            images.append(current_image)
+            xs.append(int(x_str))
+            ys.append(int(y_str))
+    return labels, images, np.array(xs, dtype=np.intp), np.array(ys, dtype=np.intp)
 
-            if not current_image or current_image not in csv_mapping:
-                # 如果没有匹配到对应的 CSV 文件
-                result_line = f"{float_value}: ({x}, {y}) - No CSV mapping for Image {current_image}"
-                all_results.append(result_line)
-                continue
 
-            csv_path = csv_mapping[current_image]
+class FieldLookup:
+    """
+    每个映射的噪声场只打开一次（mmap / 缓存），所有答案文件共用。
+    csv_mapping 的值也可以直接是场对象（如 FieldStore.lazy() 返回的 LazyNoise），只计算被查询的点。
+    """
 
-            if not os.path.exists(csv_path):
-                # 如果 CSV 文件不存在
-                result_line = f"{float_value}: ({x}, {y}) - CSV Not Found: {csv_path}"
-                all_results.append(result_line)
-                with open(log_file, 'a', encoding='utf-8') as log:
-                    log.write(f"Error: CSV file not found - {csv_path}\n")
-                continue
+    def __init__(self, csv_mapping):
+        self.csv_mapping = csv_mapping
+        self._fields = {}
+        self._errors = {}
 
+    def field(self, image):
+        """返回该 Image 的数据；不存在或读取失败时抛出异常（结果同样缓存）"""
+        if image in self._errors:
+            raise self._errors[image]
+        if image not in self._fields:
             try:
-                # 加载 CSV 文件 (跳过第一行)
-                df = pd.read_csv(csv_path, header=None, skiprows=1)
+                csv_path = self.csv_mapping[image]
+                if not isinstance(csv_path, str):
+                    self._fields[image] = csv_path
+                    return csv_path
+                if not field_exists(csv_path):
+                    raise FileNotFoundError(csv_path)
+                # 优先 mmap 读取同名 .npy，没有时再解析 CSV 文件 (跳过第一行，经缓存只解析一次)
+                self._fields[image] = open_field(csv_path)
             except Exception as e:
-                result_line = f"{float_value}: ({x}, {y}) - Fail to load CSV: {str(e)}"
-                all_results.append(result_line)
-                with open(log_file, 'a', encoding='utf-8') as log:
-                    log.write(f"Error: Fail to load CSV - {csv_path} | {e}\n")
-                continue
-
-            # 判断坐标是否越界
-            if x < 0 or x >= len(df) or y < 0 or y >= len(df.columns):
-                result_line = f"{float_value}: ({x}, {y}) - OutOfRange"
-                print(f"⚠️ Warning: OutOfRange at ({x}, {y}) in Image {current_image}")
+                self._errors[image] = e
+                raise
+        return self._fields[image]
+
+    def gather(self, image, xs, ys):
+        """
+        一次花式索引取出该 Image 上所有坐标的值，x 为行，y 为列。
+        返回 (values, in_range)，越界的点 values 为 nan。
+        """
+        data = self.field(image)
+        in_range = (xs >= 0) & (xs < data.shape[0]) & (ys >= 0) & (ys < data.shape[1])
+        values = np.full(xs.shape, np.nan)
+        values[in_range] = data[xs[in_range], ys[in_range]]
+        return values, in_range
+
+
+@instrument.timed('findvalue', output='output_txt')
+def process_coordinates(txt_file, csv_mapping, output_txt, log_file, lookup=None, results=None,
+                        folder=None, colormap=None):
+    """
+    处理坐标文件，生成结果并记录异常日志。
+    x为行，y为列
+    lookup: 共用的 FieldLookup，多次调用之间每个噪声场只读一次
+    results: ResultStore，不为 None 时同时把每个点写入结果库（folder、colormap 作为查询条件）
+    """
+    # 读取文本文件 (坐标信息)
+    if not os.path.exists(txt_file):
+        with open(log_file, 'a', encoding='utf-8') as log:
+            log.write(f"Error: Coordinate file not found - {txt_file}\n")
+        print(f"❌ Error: Coordinate file not found - {txt_file}")
+        return
+    if lookup is None:
+        lookup = FieldLookup(csv_mapping)
+
+    labels, images, xs, ys = parse_answer_file(txt_file)
+    all_results = [None] * len(labels)  # 保存处理后的结果，与坐标行一一对应
+    statuses = ['NoMapping'] * len(labels)
+    found = np.full(len(labels), np.nan)
+    log_lines = []
+    image_array = np.array(images, dtype=object)
+
+    for image in dict.fromkeys(images):
+        rows = np.flatnonzero(image_array == image)
+        if not image or image not in csv_mapping:
+            # 如果没有匹配到对应的 CSV 文件
+            for k in rows:
+                all_results[k] = f"{labels[k]}: ({xs[k]}, {ys[k]}) - No CSV mapping for Image {image}"
+            continue
+
+        csv_path = csv_mapping[image]
+        try:
+            values, in_range = lookup.gather(image, xs[rows], ys[rows])
+        except FileNotFoundError:
+            # 如果 CSV 文件（及同名 .npy）不存在
+            for k in rows:
+                all_results[k] = f"{labels[k]}: ({xs[k]}, {ys[k]}) - CSV Not Found: {csv_path}"
+                statuses[k] = 'CSV Not Found'
+                log_lines.append((k, f"Error: CSV file not found - {csv_path}\n"))
+            continue
+        except Exception as e:
+            for k in rows:
+                all_results[k] = f"{labels[k]}: ({xs[k]}, {ys[k]}) - Fail to load CSV: {str(e)}"
+                statuses[k] = 'Fail to load CSV'
+                log_lines.append((k, f"Error: Fail to load CSV - {csv_path} | {e}\n"))
+            continue
+
+        found[rows] = values
+        for k, value, ok in zip(rows, values, in_range):
+            if ok:
+                all_results[k] = f"{labels[k]}: ({xs[k]}, {ys[k]}) - {value}"
+                statuses[k] = 'ok'
             else:
-                # 读取对应位置的值
-                value_at_coord = df.iloc[x, y]
-                result_line = f"{float_value}: ({x}, {y}) - {value_at_coord}"
+                # 坐标越界
+                all_results[k] = f"{labels[k]}: ({xs[k]}, {ys[k]}) - OutOfRange"
+                statuses[k] = 'OutOfRange'
+                print(f"⚠️ Warning: OutOfRange at ({xs[k]}, {ys[k]}) in Image {image}")
 
-            all_results.append(result_line)
+    # 日志按坐标行的原顺序写入
+    if log_lines:
+        with open(log_file, 'a', encoding='utf-8') as log:
+            log.writelines(text for _, text in sorted(log_lines, key=lambda item: item[0]))
 
     # 将结果写入输出文件
     with open(output_txt, 'w', encoding='utf-8') as f:
         for line_out in all_results:
             f.write(line_out + "\n")
 
+    if results is not None:
+        field_paths = {image: path for image, path in csv_mapping.items() if isinstance(path, str)}
+        rows = [{'experiment': 'exp1', 'source': 'findvalue', 'colormap': colormap, 'folder': folder,
+                 'image': images[k], 'field': field_paths.get(images[k]), 'seq': k,
+                 'target': float(labels[k]), 'x': int(xs[k]), 'y': int(ys[k]),
+                 'value': None if np.isnan(found[k]) else float(found[k]), 'status': statuses[k]}
+                for k in range(len(labels))]
+        results.replace_answers(rows, experiment='exp1', source='findvalue', folder=folder, colormap=colormap)
+        results.commit()
+
     print(f"✅ Processed {txt_file}, results saved to {output_txt}")
 
 
@@ -110,26 +194,29 @@ def main():
     with open(log_file, 'w', encoding='utf-8') as log:
         log.write("Error Log\n")
 
-    # 处理多个坐标文件
-    for i in range(4, 5):
-        base_dir = f"../..//result//{i}"
-        gray_txt = os.path.join(base_dir, "gray.txt")
-        hot_txt = os.path.join(base_dir, "hot.txt")
-        rainbow_txt = os.path.join(base_dir, "rainbow.txt")
-
-        gray_result = os.path.join(base_dir, "gray_result.txt")
-        hot_result = os.path.join(base_dir, "hot_result.txt")
-        rainbow_result = os.path.join(base_dir, "rainbow_result.txt")
-
-        # 分别处理文件并记录日志
-        process_coordinates(gray_txt, csv_mapping, gray_result, log_file)
-        check_and_write_empty_message(gray_result)
-
-        process_coordinates(hot_txt, csv_mapping, hot_result, log_file)
-        check_and_write_empty_message(hot_result)
-
-        process_coordinates(rainbow_txt, csv_mapping, rainbow_result, log_file)
-        check_and_write_empty_message(rainbow_result)
+    # True：按噪声场元数据里的生成参数只计算被查询的点，不读取整张 .npy / CSV
+    lazy_fields = False
+    with instrument.run('findvalue'):
+        if lazy_fields:
+            csv_mapping = {image: lazy_field(path) for image, path in csv_mapping.items()}
+
+        # 所有结果文件夹、所有 colormap 一次处理完，噪声场共用同一个 FieldLookup，每个只读一次
+        result_root = r"../../result"
+        colormaps = ['gray', 'hot', 'rainbow']
+        lookup = FieldLookup(csv_mapping)
+        results = ResultStore()  # 每个点同时写入结果库，供 txttocsv 等分析脚本直接查询
+        folders = (sorted((d for d in os.listdir(result_root) if d.isdigit()), key=int)
+                   if os.path.isdir(result_root) else [])
+        for folder in folders:
+            base_dir = os.path.join(result_root, folder)
+            for colormap in colormaps:
+                txt_file = os.path.join(base_dir, f"{colormap}.txt")
+                result_file = os.path.join(base_dir, f"{colormap}_result.txt")
+                # 分别处理文件并记录日志
+                process_coordinates(txt_file, csv_mapping, result_file, log_file, lookup=lookup, results=results,
+                                    folder=folder, colormap=colormap)
+                check_and_write_empty_message(result_file)
+        results.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+"""
+findvalue 结果汇总（取代每个 colormap 各改一遍、各跑一遍的 txttocsv 脚本）
+
+一次运行：
+- 并发读取 result/<数字>/<colormap>_result.txt（所有文件夹 × 所有 colormap）
+- 每个文件解析成 NumPy 数组（目标值、查到的值），按文件夹拼成矩阵，
+  原始值和 |目标值 - 查到的值| 在整个矩阵上一次算出
+- 所有 colormap 写进同一个工作簿（每个 colormap 两张表），同时输出 CSV，按行批量写入
+也可以直接从结果库（resultstore）读取，不再扫描目录。
+"""
+
+import csv
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from openpyxl import Workbook
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import instrument
+from resultstore import ResultStore
+
+COLORMAPS = ('gray', 'hot', 'rainbow')
+
+# "1.0: (596, 372) - 0.8123"：以坐标和 " - " 分隔符定位，值里的负号 / 指数（1.2e-05）不会被当成分隔符
+LINE_PATTERN = re.compile(r'^\s*(-?[\d.]+):\s*\(\d+,\s*\d+\)\s*-\s*(\S+)\s*$')
+
+
+def parse_line(line):
+    """
+    一行结果 -> (目标值, 查到的值)；查不到值的行（OutOfRange 等）返回 None
+
+    >>> parse_line('0.2: (1, 2) - 1.2e-05')
+    (0.2, 1.2e-05)
+    >>> parse_line('1.0: (596, 372) - 0.8123')
+    (1.0, 0.8123)
+    >>> parse_line('0.5: (9, 9) - OutOfRange: (9, 9)') is None
+    True
+    """
+    match = LINE_PATTERN.match(line)
+    if not match:
+        return None
+    try:
+        return float(match.group(1)), float(match.group(2))
+    except ValueError:
+        return None
+
+
+def parse_result_file(path):
+    """返回 (targets, values)，每行一项；无法解析的行为 nan（与旧脚本的空单元格对应）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    targets = np.full(len(lines), np.nan)
+    values = np.full(len(lines), np.nan)
+    for k, line in enumerate(lines):
+        parsed = parse_line(line)
+        if parsed is not None:
+            targets[k], values[k] = parsed
+    return targets, values
+
+
+def result_folders(base_folder):
+    if not os.path.isdir(base_folder):
+        return []
+    return sorted((d for d in os.listdir(base_folder) if d.isdigit()), key=int)
+
+
+def stack_columns(columns):
+    """长度不一的一维数组按列拼成矩阵，不足的部分填 nan"""
+    rows = max((len(c) for c in columns), default=0)
+    matrix = np.full((rows, len(columns)), np.nan)
+    for j, column in enumerate(columns):
+        matrix[:len(column), j] = column
+    return matrix
+
+
+@instrument.timed('parse_results')
+def collect_from_files(base_folder, colormaps=COLORMAPS, workers=None, folders=None):
+    """
+    并发解析所有文件夹 × colormap 的结果文件。
+    folders: 要汇总的子文件夹，默认为所有数字命名的文件夹
+    返回 {colormap: (folders, targets 矩阵, values 矩阵)}，矩阵每列一个文件夹
+    """
+    if folders is None:
+        folders = result_folders(base_folder)
+    tasks = [(colormap, folder, os.path.join(base_folder, folder, f'{colormap}_result.txt'))
+             for colormap in colormaps for folder in folders]
+    tasks = [task for task in tasks if os.path.exists(task[2])]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parsed = list(pool.map(lambda task: parse_result_file(task[2]), tasks))
+
+    report = {}
+    for colormap in colormaps:
+        picked = [(task[1], data) for task, data in zip(tasks, parsed) if task[0] == colormap]
+        folders = [folder for folder, _ in picked]
+        report[colormap] = (folders,
+                            stack_columns([data[0] for _, data in picked]),
+                            stack_columns([data[1] for _, data in picked]))
+    return report
+
+
+def collect_from_store(store, colormaps=COLORMAPS):
+    """从结果库读取，返回格式与 collect_from_files 相同"""
+    report = {}
+    for colormap in colormaps:
+        rows = store.query(
+            "SELECT folder, target, value FROM answers WHERE experiment = 'exp1' AND source = 'findvalue' "
+            "AND colormap = ? ORDER BY CAST(folder AS INTEGER), folder, seq", (colormap,))
+        columns = {}
+        for row in rows:
+            value = np.nan if row['value'] is None else row['value']
+            columns.setdefault(row['folder'], ([], []))
+            columns[row['folder']][0].append(row['target'])
+            columns[row['folder']][1].append(value)
+        folders = list(columns)
+        report[colormap] = (folders,
+                            stack_columns([np.array(columns[f][0], dtype=np.float64) for f in folders]),
+                            stack_columns([np.array(columns[f][1], dtype=np.float64) for f in folders]))
+    return report
+
+
+def report_tables(report):
+    """每个 colormap 两张表：原始值、差值绝对值（整个矩阵一次向量化计算）"""
+    tables = {}
+    for colormap, (folders, targets, values) in report.items():
+        tables[colormap] = values
+        tables[f'{colormap}_diff'] = np.abs(targets - values)
+    return tables
+
+
+@instrument.timed('report_csv', output='path')
+def write_csv(path, matrix):
+    """nan 写成空单元格，其余为数值，整表一次 writerows"""
+    text = np.where(np.isnan(matrix), '', matrix.astype(str))
+    with open(path, mode='w', newline='', encoding='utf-8') as csv_file:
+        csv.writer(csv_file).writerows(text.tolist())
+
+
+@instrument.timed('report_xlsx', output='path')
+def write_workbook(path, tables):
+    """所有表写入同一个工作簿（write_only 模式，按行批量追加）"""
+    wb = Workbook(write_only=True)
+    for name, matrix in tables.items():
+        ws = wb.create_sheet(title=name)
+        for row in np.where(np.isnan(matrix), None, matrix).tolist():
+            ws.append(row)
+    wb.save(path)
+
+
+def main():
+    base_folder = r'../../result'  # 主文件夹路径（result/1, result/2, ...）
+    output_folder = r'../../result/data'
+    from_store = False  # True：直接查询结果库，不扫描目录
+    os.makedirs(output_folder, exist_ok=True)
+
+    with instrument.run('txtreport'):
+        if from_store:
+            with ResultStore() as store:
+                report = collect_from_store(store)
+        else:
+            report = collect_from_files(base_folder)
+        tables = report_tables(report)
+
+        for name, matrix in tables.items():
+            write_csv(os.path.join(output_folder, f'{name}.csv'), matrix)
+        excel_filename = os.path.join(output_folder, 'report.xlsx')
+        write_workbook(excel_filename, tables)
+        for colormap, (folders, _, values) in report.items():
+            print(f"{colormap}: {len(folders)} 个文件夹，{values.shape[0]} 行")
+        print(f"已将所有 colormap 的数值和差值绝对值保存到 {excel_filename} 及同目录的 CSV")
+
+
+if __name__ == "__main__":
+    main()
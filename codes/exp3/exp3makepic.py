@@ -1,11 +1,19 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import os
-import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import instrument
+from compositor import render_base, save, stamp_label, stamp_point
+from fieldstore import FieldStore
+from profiles import ProfileIndex
+from resultstore import ResultStore, field_params
 
 
 # 生成标量场图像，仅显示 AB 点标记
-def generate_scalar_field_image(noise, colormap, ab_positions, output_filepath):
+def generate_scalar_field_image(noise, colormap, ab_positions, output_filepath, base=None):
+    """base 为该噪声场在此 colormap 下的着色底图，可在多轮之间复用"""
     ax, ay, bx, by = ab_positions
 
     # 动态设置标记点的颜色
@@ -16,20 +24,19 @@ def generate_scalar_field_image(noise, colormap, ab_positions, output_filepath):
     elif colormap == "gray":
         color = 'red'  # 默认红色
 
-    # 创建标量场图像
-    plt.figure(figsize=(6, 6))
-    plt.imshow(noise, cmap=colormap, origin='upper')
-    plt.axis('off')
-    plt.scatter(ax, ay, color=color, label='A', s=20, zorder=5)  # 标记点 A
-    plt.scatter(bx, by, color=color, label='B', s=20, zorder=5)  # 标记点 B
-    plt.text(ax, ay - 10, 'A', color=color, fontsize=12, ha='center', va='bottom')  # A 的文字标签上移
-    plt.text(bx, by - 10, 'B', color=color, fontsize=12, ha='center', va='bottom')  # B 的文字标签上移
-    plt.tight_layout()
-    plt.savefig(output_filepath, dpi=150, bbox_inches='tight', pad_inches=0)
-    plt.close()
+    # 在底图副本上直接画 A、B 两点及文字
+    if base is None:
+        base = render_base(noise, colormap)
+    pixels = base.copy()
+    stamp_point(pixels, ax, ay, color)  # 标记点 A
+    stamp_point(pixels, bx, by, color)  # 标记点 B
+    stamp_label(pixels, ax, ay - 10, 'A', color)  # A 的文字标签上移
+    stamp_label(pixels, bx, by - 10, 'B', color)  # B 的文字标签上移
+    save(pixels, output_filepath)
 
 
 # 生成包含剖面曲线的组合图像
+@instrument.timed('profiles_png', output='output_filepath')
 def generate_profiles_image(noise, colormap, ab_positions, all_profiles, output_filepath):
     ax, ay, bx, by = ab_positions
     # 动态设置标记点的颜色
@@ -78,57 +85,82 @@ def generate_profiles_image(noise, colormap, ab_positions, all_profiles, output_
     plt.close()
 
 
+# 生成一轮 exp3 刺激图：A/B 标记的标量场图 + 6 条剖面曲线图
+def generate_profile_round(index, field_name, colormap, i, output_dir, rng, corr_band=None, base=None):
+    """
+    index: 该噪声场的 ProfileIndex；base: 该噪声场在此 colormap 下的底图（可复用）
+    返回 (剖面图路径, 真实曲线的下标, all_profiles, 各曲线与真实剖面的相关系数)
+    """
+    noise = index.field
+
+    # 随机生成 A 和 B 的位置
+    ax, ay = index.random_position(rng)
+    bx, by = ax + 350, ay
+    ab_positions = (ax, ay, bx, by)
+
+    # 真实剖面 + 在相似度区间内一次挑出的 5 条伪造剖面
+    fakes = index.pick_distractors(ax, ay, n=5, corr_band=corr_band, rng=rng)
+    all_profiles = [(ax, ay, bx, by, index.profile(ax, ay))]
+    for fake_ax, fake_ay in zip(fakes['x'].tolist(), fakes['y'].tolist()):
+        all_profiles.append((fake_ax, fake_ay, fake_ax + 350, fake_ay, index.profile(fake_ax, fake_ay)))
+    corrs = [1.0] + fakes['corr'].tolist()
+    order = rng.permutation(len(all_profiles))
+    all_profiles = [all_profiles[k] for k in order]
+    corrs = [corrs[k] for k in order]
+    real_index = int(np.flatnonzero(order == 0)[0])
+
+    # 输出标量场图像
+    scalar_field_filepath = os.path.join(output_dir, f"ScalarField_{field_name}_{colormap}_{i}.png")
+    generate_scalar_field_image(noise, colormap, ab_positions, scalar_field_filepath, base=base)
+
+    # 输出剖面曲线图像
+    profiles_filepath = os.path.join(output_dir, f"Profiles_{field_name}_{colormap}_{i}.png")
+    generate_profiles_image(noise, colormap, ab_positions, all_profiles, profiles_filepath)
+    return profiles_filepath, real_index, all_profiles, corrs
+
+
 # 主函数
 def main():
-    csv_dir = r"E:\桌面\Final project\data\uncolor"  # 存储 CSV 的目录
+    csv_dir = r"E:\桌面\Final project\data\uncolor"  # 存储噪声数据（.npy / 旧 CSV）的目录
     colromap_list = ['gray', 'hot', 'rainbow']
-    for colormap in colromap_list:
-        output_dir = f"E:\桌面\Final project\color\exp3\{colormap}"  # 输出图像文件夹
-        os.makedirs(output_dir, exist_ok=True)
-        result_file_path = os.path.join(output_dir, "result.txt")
-        with open(result_file_path, "w") as result_file:
-            for i in range(1, 4):
-                for csv_filename in os.listdir(csv_dir):
-                    if csv_filename.endswith(".csv"):
-                        csv_filepath = os.path.join(csv_dir, csv_filename)
-                        print(f"正在读取 CSV 文件: {csv_filepath}")
-                        noise = np.loadtxt(csv_filepath, delimiter=",", skiprows=1)
-                        noise = (noise - noise.min()) / (noise.max() - noise.min())
-
-                        # 随机生成 A 和 B 的位置
-                        ax = random.randint(30, noise.shape[1] - 351 - 30)
-                        ay = random.randint(30, noise.shape[0] - 30)
-                        bx, by = ax + 350, ay
-                        ab_positions = (ax, ay, bx, by)
-
-                        # 生成真实剖面和伪造剖面
-                        real_profile = noise[ay, ax:bx + 1]
-                        fake_profiles = []
-                        for _ in range(5):
-                            while True:
-                                fake_ax = random.randint(30, noise.shape[1] - 351 - 30)
-                                fake_ay = random.randint(30, noise.shape[0] - 30)
-                                fake_bx, fake_by = fake_ax + 350, fake_ay
-                                if (fake_ax, fake_ay) != (ax, ay):
-                                    break
-                            fake_profiles.append((fake_ax, fake_ay, fake_bx, fake_by, noise[fake_ay, fake_ax:fake_bx + 1]))
-                        all_profiles = [(ax, ay, bx, by, real_profile)] + fake_profiles
-                        random.shuffle(all_profiles)
-                        real_index = all_profiles.index((ax, ay, bx, by, real_profile))
-
-                        # 输出标量场图像
-                        scalar_field_filepath = os.path.join(output_dir,
-                                                             f"ScalarField_{os.path.splitext(csv_filename)[0]}_{colormap}_{i}.png")
-                        generate_scalar_field_image(noise, colormap, ab_positions, scalar_field_filepath)
-
-                        # 输出剖面曲线图像
-                        profiles_filepath = os.path.join(output_dir,
-                                                         f"Profiles_{os.path.splitext(csv_filename)[0]}_{colormap}_{i}.png")
-                        generate_profiles_image(noise, colormap, ab_positions, all_profiles, profiles_filepath)
+    seed = None  # 固定为整数可复现 A/B 位置和干扰曲线
+    corr_band = (-1.0, 0.95)  # 干扰曲线与真实剖面的相关系数区间，上限排除几乎相同的曲线
+    rng = np.random.default_rng(seed)
+    with instrument.run('exp3makepic'):
+        store = FieldStore(csv_dir)
+        results = ResultStore()  # 每张剖面图的 6 条曲线（位置、是否真实、相关系数）同时写入结果库
+        indexes = {}  # 每张噪声场的剖面索引，所有 colormap 和轮次共用
+        for colormap in colromap_list:
+            bases = {}  # 每张噪声场在当前 colormap 下的底图，三轮 i 共用
+            output_dir = f"E:\桌面\Final project\color\exp3\{colormap}"  # 输出图像文件夹
+            os.makedirs(output_dir, exist_ok=True)
+            result_file_path = os.path.join(output_dir, "result.txt")
+            with open(result_file_path, "w") as result_file:
+                for i in range(1, 4):
+                    for field_name in store.names():
+                        if field_name not in indexes:
+                            print(f"正在读取噪声场: {field_name}")
+                            # mmap 零拷贝读取（已归一化），每张噪声场只读一次、建一次索引
+                            indexes[field_name] = ProfileIndex(store.load(field_name), length=351, margin=30)
+                        index = indexes[field_name]
+                        if field_name not in bases:
+                            bases[field_name] = render_base(index.field, colormap)
+
+                        profiles_filepath, real_index, all_profiles, corrs = generate_profile_round(
+                            index, field_name, colormap, i, output_dir, rng, corr_band, base=bases[field_name])
 
                         # 修改后的代码段
                         result_file.write(f"{os.path.basename(profiles_filepath)} + 真实曲线是第 {real_index + 1} 条\n")
                         print(f"{os.path.basename(profiles_filepath)} + 真实曲线是第 {real_index + 1} 条")
 
+                        stimulus_id = results.add_stimulus('exp3', os.path.basename(profiles_filepath), colormap,
+                                                           field=field_name,
+                                                           params=field_params(field_name, store.meta(field_name)),
+                                                           round=i)
+                        results.add_profiles(stimulus_id, [(p[0], p[1], 351, k == real_index, c)
+                                                           for k, (p, c) in enumerate(zip(all_profiles, corrs))])
+                results.commit()
+        results.close()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,111 @@
+"""
+本地的 chat.completions 替身服务器，用来离线测试 gpteval.py
+
+- 每个请求延迟 latency ± jitter 秒
+- 每秒超过 rate_limit 个请求时返回 429（带 Retry-After）
+- 以 error_rate 的概率返回 500
+- 支持 HTTP/1.1 keep-alive，统计连接数和请求数
+回答内容是按请求体哈希生成的固定坐标，格式与真实模型的回答相同。
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import deque
+
+VALUES = (1.0, 0.8, 0.6, 0.4, 0.2)
+
+
+def fake_answer(body):
+    digest = hashlib.sha256(body).digest()
+    return "\n".join(f"{v}: ({digest[2 * k] * 3 % 820}, {digest[2 * k + 1] * 3 % 630})"
+                     for k, v in enumerate(VALUES))
+
+
+class FakeAPI:
+    def __init__(self, latency=0.2, jitter=0.1, rate_limit=None, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.connections = 0
+        self.requests = 0
+        self.status_counts = {}
+        self._recent = deque()
+        self._random = random.Random(seed)
+        self._server = None
+
+    def _rate_limited(self):
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 1.0:
+            self._recent.popleft()
+        if len(self._recent) >= self.rate_limit:
+            return True
+        self._recent.append(now)
+        return False
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                self.requests += 1
+
+                extra = ""
+                if self._rate_limited():
+                    status, payload, extra = 429, {"error": {"message": "Rate limit reached"}}, "Retry-After: 0.2\r\n"
+                elif self._random.random() < self.error_rate:
+                    status, payload = 500, {"error": {"message": "Internal server error"}}
+                else:
+                    await asyncio.sleep(max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter)))
+                    model = json.loads(body).get("model", "")
+                    status, payload = 200, {
+                        "object": "chat.completion", "model": model,
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": fake_answer(body)}}],
+                    }
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+                data = json.dumps(payload).encode('utf-8')
+                writer.write((f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                              f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n{extra}\r\n"
+                              ).encode('latin-1') + data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=0):
+        """启动服务器，返回可直接传给 EvalClient 的 base_url"""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}/v1"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+
+async def serve(port=8000, **kwargs):
+    api = FakeAPI(**kwargs)
+    base_url = await api.start(port=port)
+    print(f"替身服务器已启动: {base_url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(latency=0.5, rate_limit=20, error_rate=0.05))
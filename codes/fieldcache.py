@@ -0,0 +1,178 @@
+"""
+噪声场缓存，各实验脚本共用
+
+- 按参数寻址：(shape, res, octaves, persistence, seed, 引擎版本) -> 归一化后的噪声场
+- 按内容寻址：已有的 CSV 文件按其字节的 SHA-256 缓存，只解析一次
+两级存储：内存中按 LRU 保留最近用过的数组（总字节数有上限），
+磁盘上以 .npy 二进制保存（同样按总字节数 LRU 淘汰），命中时用 mmap 读取。
+
+按参数的一级由 sweep.generate_job_noise(job, cache=True) 使用（exp1makepic、makeimg、
+gpttest 流水线的 use_cache 开关），按内容的一级由 fieldstore 读取旧 CSV 时使用。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from noisegen import ENGINE_VERSION, noise_engine
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'cache')
+
+
+def seed_key(seed):
+    """把 int / SeedSequence 统一成可哈希的 (entropy, spawn_key)"""
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [seed.entropy, list(seed.spawn_key)]
+
+
+def file_digest(filepath, chunk_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def normalize(noise):
+    return (noise - noise.min()) / (noise.max() - noise.min())
+
+
+class FieldCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_memory_bytes=512 * 2**20,
+                 max_disk_bytes=8 * 2**30):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._digests = {}
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ---------- 键 ----------
+    @staticmethod
+    def field_key(shape, res, octaves=5, persistence=0.5, seed=0, dtype=np.float64, engine='perlin'):
+        params = {
+            'shape': list(shape), 'res': list(res), 'octaves': octaves,
+            'persistence': persistence, 'seed': seed_key(seed),
+            'dtype': np.dtype(dtype).str, 'engine': ENGINE_VERSION,
+        }
+        if engine != 'perlin':  # Perlin 的键保持不变，旧缓存继续有效
+            params['generator'] = engine
+        text = json.dumps(params, sort_keys=True)
+        return 'field-' + hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    # ---------- 对外接口 ----------
+    def get(self, shape, res, octaves=5, persistence=0.5, seed=0, dtype=np.float64, engine='perlin'):
+        """按参数取归一化噪声场，未命中时用 seed 生成并写入缓存"""
+        key = self.field_key(shape, res, octaves, persistence, seed, dtype, engine)
+
+        def build():
+            rng = np.random.default_rng(seed)
+            noise = noise_engine(engine)(shape, res, octaves, persistence, dtype=dtype, rng=rng)
+            return normalize(noise)
+
+        return self._lookup(key, build)
+
+    def get_job(self, job, dtype=np.float64):
+        """sweep.build_jobs 生成的任务"""
+        return self.get(job['shape'], job['res'], job['octaves'], job['persistence'], job['seed'], dtype,
+                        job.get('engine', 'perlin'))
+
+    def get_csv(self, csv_path, normalized=True):
+        """读取 exp1 输出的 CSV（跳过 header 行），同一内容只解析一次"""
+        key = f"csv-{self._csv_digest(csv_path)}-{int(normalized)}"
+
+        def build():
+            data = np.loadtxt(csv_path, delimiter=",", skiprows=1)
+            return normalize(data) if normalized else data
+
+        return self._lookup(key, build)
+
+    def clear_memory(self):
+        self._memory.clear()
+        self._memory_bytes = 0
+
+    # ---------- 内部实现 ----------
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def _csv_digest(self, csv_path):
+        # 文件未改动（路径、大小、修改时间相同）时不必重新计算哈希
+        stat = os.stat(csv_path)
+        ident = (os.path.abspath(csv_path), stat.st_size, stat.st_mtime_ns)
+        if ident not in self._digests:
+            self._digests[ident] = file_digest(csv_path)
+        return self._digests[ident]
+
+    def _lookup(self, key, build):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+
+        path = self._path(key)
+        if os.path.exists(path):
+            self.hits += 1
+            os.utime(path)  # 更新时间戳，磁盘 LRU 依据
+            data = np.load(path, mmap_mode='r')
+        else:
+            self.misses += 1
+            data = np.ascontiguousarray(build())
+            self._write(path, data)
+            data.flags.writeable = False
+        self._remember(key, data)
+        return data
+
+    def _write(self, path, data):
+        # 先写临时文件再改名，多个进程同时写同一个键也不会读到半个文件
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, data)
+        os.replace(tmp_path, path)
+        self._evict_disk()
+
+    def _remember(self, key, data):
+        if data.nbytes > self.max_memory_bytes:
+            return
+        self._memory[key] = data
+        self._memory_bytes += data.nbytes
+        while self._memory_bytes > self.max_memory_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_bytes -= old.nbytes
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npy'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:  # 被其他进程淘汰了
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:  # 已被删除，或在 Windows 上仍被 mmap 占用
+                continue
+            total -= size
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    """每个进程一个共享实例（磁盘部分在进程间共享）"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = FieldCache()
+    return _default_cache
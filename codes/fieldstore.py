@@ -0,0 +1,151 @@
+"""
+噪声场存储：每个场一个 .npy（二进制，可 mmap 零拷贝读取）+ 一个同名 .json 元数据，
+目录下的 index.json 汇总所有场的名字、形状和生成参数。
+
+读取时用 np.load(mmap_mode='r')，取一个方框或一行剖面只会读到涉及的页。
+CSV 只作为按需导出格式（给需要用 Excel 打开的人），不再是主存储格式。
+旧目录里只有 CSV 的场仍可读取，会经由 fieldcache 只解析一次。
+"""
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+import instrument
+from fieldcache import get_default_cache
+from lazynoise import LazyNoise
+
+CSV_HEADER = "Normalized Elevation Data"
+
+
+class FieldStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def npy_path(self, name):
+        return os.path.join(self.root, name + '.npy')
+
+    def meta_path(self, name):
+        return os.path.join(self.root, name + '.json')
+
+    def csv_path(self, name):
+        return os.path.join(self.root, name + '.csv')
+
+    # ---------- 写 ----------
+    def save(self, name, noise, **params):
+        """
+        保存一个场及其参数。先写临时文件再改名，
+        进程池中多个任务同时写不同的场互不影响（元数据各自一个文件）。
+        """
+        noise = np.ascontiguousarray(noise)
+        with instrument.stage('field_save', self.npy_path(name)):
+            self._atomic_write(self.npy_path(name), lambda f: np.save(f, noise))
+        meta = {'name': name, 'shape': list(noise.shape), 'dtype': noise.dtype.str,
+                'params': {k: _jsonable(v) for k, v in params.items()}}
+        self._atomic_write(self.meta_path(name),
+                           lambda f: f.write(json.dumps(meta, ensure_ascii=False, indent=1).encode('utf-8')))
+        return self.npy_path(name)
+
+    def write_index(self):
+        """把所有 .json 元数据汇总成 index.json（在一轮扫描结束后调用）"""
+        index = {name: self.meta(name) for name in self.names()}
+        self._atomic_write(os.path.join(self.root, 'index.json'),
+                           lambda f: f.write(json.dumps(index, ensure_ascii=False, indent=1).encode('utf-8')))
+        return index
+
+    def export_csv(self, name, csv_path=None):
+        """按需导出为旧格式 CSV（带 header 行，与 exp1 以前写的文件一致）"""
+        csv_path = csv_path or self.csv_path(name)
+        with instrument.stage('csv_export', csv_path):
+            np.savetxt(csv_path, self.load(name), delimiter=",", header=CSV_HEADER, comments="")
+        return csv_path
+
+    # ---------- 读 ----------
+    def names(self):
+        """所有场的名字（有 .npy 的，以及只有旧 CSV 的），按名字排序"""
+        names = set()
+        for filename in os.listdir(self.root):
+            base, ext = os.path.splitext(filename)
+            if ext in ('.npy', '.csv'):
+                names.add(base)
+        return sorted(names)
+
+    def exists(self, name):
+        return os.path.exists(self.npy_path(name)) or os.path.exists(self.csv_path(name))
+
+    def meta(self, name):
+        if os.path.exists(self.meta_path(name)):
+            with open(self.meta_path(name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'name': name, 'params': {}}
+
+    def load(self, name):
+        """只读 memmap；没有 .npy 时回退到旧 CSV（经缓存只解析一次）"""
+        if os.path.exists(self.npy_path(name)):
+            return np.load(self.npy_path(name), mmap_mode='r')
+        if os.path.exists(self.csv_path(name)):
+            return get_default_cache().get_csv(self.csv_path(name), normalized=False)
+        raise FileNotFoundError(f"找不到噪声场 {name}（{self.root}）")
+
+    def lazy(self, name):
+        """不读 .npy，按元数据里的生成参数重建一个按需求值的 LazyNoise（只取少量点或窗口时用）"""
+        return LazyNoise.from_meta(self.meta(name))
+
+    def items(self):
+        for name in self.names():
+            yield name, self.load(name)
+
+    # ---------- 内部实现 ----------
+    def _atomic_write(self, path, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+
+def _split_field_path(path):
+    folder, filename = os.path.split(path)
+    return folder or '.', os.path.splitext(filename)[0]
+
+
+def field_exists(path):
+    """path 为 .csv 或 .npy 路径，同名的任一格式存在即可"""
+    folder, name = _split_field_path(path)
+    return os.path.exists(os.path.join(folder, name + '.npy')) or os.path.exists(os.path.join(folder, name + '.csv'))
+
+
+def open_field(path):
+    """按文件路径读取一个场：优先同名 .npy（mmap），否则解析 CSV（经缓存只解析一次）"""
+    folder, name = _split_field_path(path)
+    return FieldStore(folder).load(name)
+
+
+def lazy_field(path):
+    """按文件路径找到同名 .json 元数据，返回按需求值的 LazyNoise（不读取 .npy / CSV）"""
+    folder, name = _split_field_path(path)
+    return FieldStore(folder).lazy(name)
+
+
+def _jsonable(value):
+    if isinstance(value, np.random.SeedSequence):
+        return {'entropy': value.entropy, 'spawn_key': list(value.spawn_key)}
+    if isinstance(value, tuple):
+        return list(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def main():
+    # 把 uncolor 目录下所有场导出为 CSV（需要用 Excel 查看时运行）
+    store = FieldStore(r'../data/uncolor')
+    for name in store.names():
+        if os.path.exists(store.npy_path(name)):
+            print(f"已导出: {store.export_csv(name)}")
+
+
+if __name__ == "__main__":
+    main()
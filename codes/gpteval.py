@@ -0,0 +1,333 @@
+"""
+异步的视觉模型评测客户端（取代 gpttest.py 里逐张阻塞调用的写法）
+
+- asyncio 并发：同时在途的请求数有上限（concurrency）
+- 令牌桶限速：平均每秒最多 rate 个请求，允许 burst 个突发
+- 429 / 5xx / 连接错误自动重试：指数退避 + 随机抖动，服务器给出 Retry-After 时以它为准
+- 连接在请求之间复用，不必每次重新握手：装了 httpx 时用 httpx.AsyncClient 的连接池，
+  否则用这里基于 asyncio streams 的 HTTP/1.1 keep-alive 连接池（限速和重试两种传输层共用）
+- 结果按图片 id 返回：{image_id: 回答文本}
+- 可选的磁盘回答缓存（responsecache.py）：图片和提示都没变时不再重复请求
+
+内置连接池只用标准库（asyncio + ssl），base_url 指向本地的 fakeapi.py 即可离线测试。
+"""
+
+import asyncio
+import base64
+import json
+import os
+import random
+import ssl
+import time
+from urllib.parse import urlsplit
+
+try:
+    import httpx
+except ImportError:  # 没有安装 httpx 时使用内置的 ConnectionPool
+    httpx = None
+
+from responsecache import request_key
+
+API_BASE_URL = "https://api.openai.com/v1"
+DEFAULT_MODEL = "gpt-4o"
+
+
+class APIError(Exception):
+    """重试用尽或不可重试的 HTTP 错误"""
+
+    def __init__(self, status, body=b''):
+        self.status = status
+        self.body = body
+        super().__init__(f"HTTP {status}: {body[:200].decode('utf-8', 'replace')}")
+
+
+def encode_image(image_path):
+    with open(image_path, "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode('utf-8')
+
+
+def build_messages(prompt, base64_image, mime="image/png"):
+    """文字提示 + 一张 base64 图片，对应 chat.completions 的 messages 格式"""
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{base64_image}"}},
+            ],
+        }
+    ]
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多存 capacity 个；rate 为 None 时不限速"""
+
+    def __init__(self, rate=None, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate or 1, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ConnectionPool:
+    """同一主机的 HTTP/1.1 keep-alive 连接池"""
+
+    def __init__(self, base_url, max_idle=8):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        # Host 头：不是协议默认端口时要带上端口号
+        host = f"[{self.host}]" if ':' in self.host else self.host
+        self.host_header = host if self.port == (443 if self.https else 80) else f"{host}:{self.port}"
+        self.path_prefix = parts.path.rstrip('/')
+        self.max_idle = max_idle
+        self.opened = 0  # 累计新建的连接数
+        self._idle = []
+        self._ssl = ssl.create_default_context() if self.https else None
+
+    async def _open(self):
+        self.opened += 1
+        return await asyncio.open_connection(self.host, self.port, ssl=self._ssl, limit=2 ** 24)
+
+    async def request(self, method, path, headers, body=b''):
+        """返回 (status, headers, body)；复用的连接已被服务器关闭时自动换新连接重发一次"""
+        reused = bool(self._idle)
+        conn = self._idle.pop() if reused else await self._open()
+        try:
+            status, resp_headers, data, keep_alive = await self._send(conn, method, path, headers, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            if not reused:
+                raise
+            conn = await self._open()
+            status, resp_headers, data, keep_alive = await self._send(conn, method, path, headers, body)
+
+        if keep_alive and len(self._idle) < self.max_idle:
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+        return status, resp_headers, data
+
+    async def _send(self, conn, method, path, headers, body):
+        """一次请求，失败（包括重发时的新连接）时先关闭这条连接再抛出"""
+        try:
+            return await self._roundtrip(conn, method, path, headers, body)
+        except BaseException:
+            conn[1].close()
+            raise
+
+    async def _roundtrip(self, conn, method, path, headers, body):
+        reader, writer = conn
+        lines = [f"{method} {self.path_prefix}{path} HTTP/1.1", f"Host: {self.host_header}",
+                 f"Content-Length: {len(body)}", "Connection: keep-alive"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("服务器关闭了连接")
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            # 不是 HTTP 响应（代理错误页、协议不符等），按连接错误处理：关闭这条连接并重试
+            raise ConnectionError(f"无法解析的状态行: {status_line[:100]!r}") from None
+        resp_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            resp_headers[key.strip().lower()] = value.strip()
+
+        keep_alive = resp_headers.get('connection', '').lower() != 'close'
+        if resp_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            data = b''.join(chunks)
+        elif 'content-length' in resp_headers:
+            data = await reader.readexactly(int(resp_headers['content-length']))
+        else:
+            data = await reader.read()
+            keep_alive = False
+        return status, resp_headers, data, keep_alive
+
+    def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+    async def aclose(self):
+        self.close()
+
+
+class HttpxPool:
+    """httpx.AsyncClient 作为传输层：连接池、TLS 和 HTTP 解析交给 httpx，接口与 ConnectionPool 相同"""
+
+    def __init__(self, base_url, max_idle=8):
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=max_idle)
+        # 超时由 EvalClient 用 asyncio.wait_for 统一控制
+        self._client = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=None)
+
+    async def request(self, method, path, headers, body=b''):
+        """返回 (status, headers, body)，headers 的键为小写；传输错误转成 ConnectionError，交给重试逻辑"""
+        try:
+            response = await self._client.request(method, path, headers=headers, content=body)
+        except httpx.TransportError as e:
+            raise ConnectionError(f"{type(e).__name__}: {e}") from e
+        return response.status_code, {k.lower(): v for k, v in response.headers.items()}, response.content
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class EvalClient:
+    def __init__(self, api_key=None, base_url=API_BASE_URL, model=DEFAULT_MODEL, concurrency=8,
+                 rate=None, burst=None, max_retries=6, backoff=1.0, max_backoff=60.0, timeout=120.0,
+                 cache=None, transport=None):
+        """
+        - concurrency: 同时在途的请求数上限（也是连接池大小）
+        - rate / burst: 令牌桶限速，每秒请求数 / 突发数，None 表示不限速
+        - max_retries:  429 / 5xx / 连接错误的最大重试次数
+        - backoff:      第 k 次重试等待 U(0.5, 1) * min(max_backoff, backoff * 2**k) 秒
+        - cache:        ResponseCache，命中时直接返回缓存的回答，None 表示不缓存
+        - transport:    'httpx'（httpx.AsyncClient）或 'asyncio'（内置 ConnectionPool），None 表示装了 httpx 就用它
+        """
+        if transport is None:
+            transport = 'httpx' if httpx is not None else 'asyncio'
+        if transport not in ('httpx', 'asyncio'):
+            raise ValueError(f"未知的 transport: {transport!r}，可选 'httpx' 或 'asyncio'")
+        if transport == 'httpx' and httpx is None:
+            raise ImportError("transport='httpx' 需要安装 httpx")
+        self.transport = transport
+        self.api_key = api_key if api_key is not None else os.environ.get("OPENAI_API_KEY", "")
+        self.model = model
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.base_url = base_url
+        self.rate = rate
+        self.burst = burst
+        self.cache = cache
+        self.retries = 0  # 累计重试次数
+
+    def _retry_delay(self, attempt, retry_after=None):
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    async def complete(self, messages, **params):
+        """发送一次 chat.completions 请求（含限速和重试），返回解析后的 JSON"""
+        body = json.dumps({"model": self.model, "messages": messages, **params}).encode('utf-8')
+        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
+        for attempt in range(self.max_retries + 1):
+            await self._bucket.acquire()
+            retry_after = None
+            try:
+                status, resp_headers, data = await asyncio.wait_for(
+                    self._pool.request("POST", "/chat/completions", headers, body), self.timeout)
+            except (ConnectionError, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                error = e
+            else:
+                if status == 200:
+                    return json.loads(data)
+                error = APIError(status, data)
+                if status != 429 and status < 500:
+                    raise error
+                retry_after = resp_headers.get('retry-after')
+            if attempt == self.max_retries:
+                raise error
+            self.retries += 1
+            await asyncio.sleep(self._retry_delay(attempt, retry_after))
+
+    async def _evaluate_one(self, image_id, messages, params, results, errors, progress):
+        status = "完成"
+        try:
+            key = request_key(messages, self.model, params) if self.cache is not None else None
+            answer = self.cache.get(key) if key else None
+            if answer is not None:
+                status = "缓存命中"
+            else:
+                response = await self.complete(messages, **params)
+                answer = response["choices"][0]["message"]["content"]
+                if key:
+                    self.cache.put(key, answer, image_id=image_id, model=self.model)
+            results[image_id] = answer
+        except Exception as e:
+            errors[image_id] = e
+            status = "失败"
+        finally:
+            self._slots.release()
+            progress[0] += 1
+            print(f"[{progress[0]}] {image_id} {status}")
+
+    async def evaluate_async(self, requests, **params):
+        """
+        requests: 可迭代的 (image_id, messages)，可以是生成器——在线程里逐个取出，
+        所以生成/编码下一张图的同时，前面的请求已在网络上等待。
+        返回 (results, errors)，分别为 {image_id: 回答} 和 {image_id: 异常}
+        """
+        pool_class = HttpxPool if self.transport == 'httpx' else ConnectionPool
+        self._pool = pool_class(self.base_url, max_idle=self.concurrency)
+        self._bucket = TokenBucket(self.rate, self.burst)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        results, errors, progress = {}, {}, [0]
+        tasks = []
+        iterator = iter(requests)
+        done = object()
+        try:
+            while True:
+                await self._slots.acquire()
+                item = await asyncio.to_thread(next, iterator, done)
+                if item is done:
+                    self._slots.release()
+                    break
+                image_id, messages = item
+                tasks.append(asyncio.create_task(
+                    self._evaluate_one(image_id, messages, params, results, errors, progress)))
+            await asyncio.gather(*tasks)
+        finally:
+            await self._pool.aclose()
+        return results, errors
+
+    def evaluate(self, requests, **params):
+        start = time.perf_counter()
+        results, errors = asyncio.run(self.evaluate_async(requests, **params))
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        cached = f"，缓存命中 {self.cache.hits}" if self.cache is not None else ""
+        print(f"共 {len(results) + len(errors)} 张，成功 {len(results)}，失败 {len(errors)}{cached}，"
+              f"重试 {self.retries} 次，用时 {elapsed:.1f}s")
+        return results, errors
+
+
+def image_requests(fig_path, prompt):
+    """目录下每张 PNG 生成一个 (image_id, messages)，image_id 为文件名"""
+    for filename in sorted(os.listdir(fig_path)):
+        if filename.endswith('.png'):
+            yield filename, build_messages(prompt, encode_image(os.path.join(fig_path, filename)))
@@ -1,16 +1,14 @@
-from openai import OpenAI
 import os
-import base64
 
-client = OpenAI(
-    api_key="sk-aoVUFXxLA9UfcZk5BAf33vQ0A0Ljjase8iLsPFwetntzdnoa"
-)
+from gpteval import EvalClient, image_requests
+from responsecache import ResponseCache
+from resultstore import ResultStore, parse_coordinate_answer
+from stimuli import scalar_field_stimuli, stimulus_requests
+from sweep import build_jobs
 
-
-# Function to encode the image
-def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+api_key = os.environ.get("OPENAI_API_KEY")
+if not api_key:
+    raise SystemExit("未设置环境变量 OPENAI_API_KEY，请先设置后再运行（API key 不要写进代码）")
 
 colormap_name = 'gray'
 shape = (820, 630)
@@ -20,35 +18,38 @@ res_list = [(2, 2), (4, 4), (6, 6)]  # 基础网格分辨率
 octaves_list = [1, 3, 5]
 prepath = f'../color\\{colormap_name}\\{shape}{res}{octaves}'
 fig_path = f"../result"
+# True：不读磁盘上的 PNG，直接在内存中生成噪声场 -> PNG -> base64 -> 请求
+pipeline = False
+save_dir = None  # 流水线模式下顺便把 PNG 存到这个目录，None 表示不保存
+use_cache = False  # 流水线模式下噪声场经 data/cache 读取，参数相同的场不再重新生成
 
-for filename in os.listdir(fig_path):
-    if filename.endswith('.png'):
-        image_path = os.path.join(fig_path, filename)
-        print(image_path)
-        base64_image = encode_image(image_path)
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": """The image has dimensions of 820x630 and uses the 'gray' colormap. 
+prompt_template = """The image has dimensions of {width}x{height} and uses the '{colormap}' colormap. 
                  The data has been normalized. Please identify and mark points on the image corresponding to the data values 
                  1.0, 0.8, 0.6, 0.4, and 0.2. Provide the coordinates of the marked points. 
                  Avoid selecting points near the edges of the image and try to distribute the marked points across different areas. 
                  Only one point should be provided for each value. 
-                 Please limit the output coordinate format to 1.0: (200, 150)."""},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{base64_image}"
-                        }
-                    }
-                ]
-            }
-        ]
-        completion = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages
-        )
-        chat_response = completion
-        answer = chat_response.choices[0].message.content
-        print(f'ChatGPT: {answer}')
\ No newline at end of file
+                 Please limit the output coordinate format to 1.0: (200, 150)."""
+
+if pipeline:
+    jobs = build_jobs(shape[::-1], res_list, octaves_list, colormap_list=[colormap_name])
+    requests = stimulus_requests(scalar_field_stimuli(jobs, cache=use_cache),
+                                 lambda info: prompt_template.format(**info), save_dir=save_dir)
+else:
+    prompt = prompt_template.format(width=shape[0], height=shape[1], colormap=colormap_name)
+    requests = image_requests(fig_path, prompt)
+
+# 异步并发请求：最多 8 个同时在途，每秒最多 5 个请求，429/5xx 自动退避重试；
+# 图片和提示都没变的请求直接用缓存的回答
+client = EvalClient(api_key=api_key, model="gpt-4o", concurrency=8, rate=5, cache=ResponseCache())
+results, errors = client.evaluate(requests)
+# 回答中的每个坐标点写入结果库（同一张图重跑时覆盖旧回答）
+with ResultStore() as store:
+    for image_id, answer in sorted(results.items()):
+        print(os.path.join(fig_path, image_id))
+        print(f'ChatGPT: {answer}')
+        rows = [{'experiment': 'exp1', 'source': 'model', 'model': client.model, 'colormap': colormap_name,
+                 'image': image_id, 'seq': k, 'target': target, 'x': x, 'y': y, 'status': 'answer'}
+                for k, (target, x, y) in enumerate(parse_coordinate_answer(answer))]
+        store.replace_answers(rows, experiment='exp1', source='model', model=client.model, image=image_id)
+for image_id, error in sorted(errors.items()):
+    print(f'❌ {image_id}: {error}')
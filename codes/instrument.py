@@ -0,0 +1,255 @@
+"""
+运行记录（性能埋点）：每个阶段 / 每个产物的墙钟时间、CPU 时间、写出字节数和 tracemalloc 内存峰值。
+
+默认关闭，各脚本照常运行，不启动 tracemalloc、不写报告。需要时设置环境变量：
+    NOISE_PROFILE=1        记录各阶段 / 各产物的耗时、CPU 时间和写出字节数
+    NOISE_PROFILE=memory   另外用 tracemalloc 记录内存峰值（会明显拖慢分配密集的 NumPy 代码）
+
+用法：
+    with instrument.run('exp1makepic'):                     # main() 里包住整个流程
+        ...
+    with instrument.stage('colorbar_png', filepath):       # 一个阶段；给出路径即记为一个产物
+        ...
+    @instrument.timed('excel', output='filepath')           # 装饰已有函数，output 为输出路径参数名
+    def save_colored_excel(noise, filepath, colormap): ...
+
+run() 结束时写出 JSON + CSV 报告（data/runs/）并打印按阶段汇总的表。
+未开启时 stage() 返回同一个空上下文，timed() 只多一次全局变量判断，几乎没有开销。
+进程池中的任务用 worker(func) 包装，子进程的记录随结果一起带回主进程（unwrap）。
+"""
+
+import csv
+import functools
+import inspect
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+CODES_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_REPORT_DIR = os.path.join(CODES_DIR, '..', 'data', 'runs')
+PROFILE_ENV = 'NOISE_PROFILE'
+
+RECORD_FIELDS = ['name', 'path', 'parent', 'depth', 'pid', 'wall_s', 'cpu_s', 'bytes', 'mem_peak_mb', 'error', 'tags']
+
+_recorder = None  # 当前进程的记录器，None 表示未开启
+_NULL = nullcontext()
+
+
+class _Stage:
+    def __init__(self, recorder, name, path, tags):
+        self.recorder = recorder
+        self.record = {'name': name, 'path': path, 'tags': tags}
+        self.bytes = 0
+        self.peak = 0
+
+    def __enter__(self):
+        self.recorder._enter(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder._exit(self, exc_type)
+        return False
+
+
+class Recorder:
+    def __init__(self, name, trace_memory=True):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.records = []
+        self._stack = []
+        self._started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    def stage(self, name, path=None, **tags):
+        return _Stage(self, name, path, tags)
+
+    def _enter(self, stage):
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                # 重置全局峰值前先记到外层阶段上
+                self._stack[-1].peak = max(self._stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            stage.mem_base = current
+        stage.record['parent'] = self._stack[-1].record['name'] if self._stack else None
+        stage.record['depth'] = len(self._stack)
+        self._stack.append(stage)
+        stage.cpu_start = time.process_time()
+        stage.start = time.perf_counter()
+
+    def _exit(self, stage, exc_type):
+        wall = time.perf_counter() - stage.start
+        cpu = time.process_time() - stage.cpu_start
+        self._stack.pop()
+        record = stage.record
+        path = record['path']
+        if isinstance(path, (str, os.PathLike)) and os.path.isfile(path):
+            stage.bytes += os.path.getsize(path)
+        record.update(pid=os.getpid(), wall_s=wall, cpu_s=cpu, bytes=stage.bytes,
+                      error=exc_type.__name__ if exc_type else None)
+        record['path'] = os.fspath(path) if isinstance(path, (str, os.PathLike)) else None
+        if self.trace_memory:
+            peak = max(stage.peak, tracemalloc.get_traced_memory()[1])
+            record['mem_peak_mb'] = max(0, peak - stage.mem_base) / 2**20
+        else:
+            record['mem_peak_mb'] = None
+        if self._stack:
+            self._stack[-1].bytes += stage.bytes
+        self.records.append(record)
+
+    def add_bytes(self, n):
+        if self._stack:
+            self._stack[-1].bytes += n
+
+    def merge(self, records, **tags):
+        """并入子进程带回的记录，挂在当前阶段下面"""
+        depth = len(self._stack)
+        parent = self._stack[-1].record['name'] if self._stack else None
+        for record in records:
+            record = dict(record, depth=record['depth'] + depth, tags=dict(record['tags'], **tags))
+            if record['parent'] is None:
+                record['parent'] = parent
+                if self._stack:
+                    self._stack[-1].bytes += record['bytes']
+            self.records.append(record)
+
+    def close(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    # ---------- 报告 ----------
+    def summary(self):
+        """按阶段名汇总（嵌套阶段各自计入，所以占比之和可能超过 100%）"""
+        total = max((r['wall_s'] for r in self.records if r['depth'] == 0), default=0.0)
+        rows = {}
+        for r in self.records:
+            row = rows.setdefault(r['name'], {'name': r['name'], 'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0,
+                                              'bytes': 0, 'mem_peak_mb': None, 'errors': 0})
+            row['count'] += 1
+            row['wall_s'] += r['wall_s']
+            row['cpu_s'] += r['cpu_s']
+            if r['path'] is not None:
+                row['bytes'] += r['bytes']  # 只统计产物本身，避免外层阶段重复计入
+            if r['mem_peak_mb'] is not None:
+                row['mem_peak_mb'] = max(row['mem_peak_mb'] or 0.0, r['mem_peak_mb'])
+            row['errors'] += r['error'] is not None
+        for row in rows.values():
+            row['share'] = row['wall_s'] / total if total else None
+        return sorted(rows.values(), key=lambda row: -row['wall_s'])
+
+    def save(self, output_dir=DEFAULT_REPORT_DIR):
+        os.makedirs(output_dir, exist_ok=True)
+        stem = os.path.join(output_dir, f"{self.name}_{time.strftime('%Y%m%d_%H%M%S')}")
+        with open(stem + '.json', 'w', encoding='utf-8') as f:
+            json.dump({'run': self.name, 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'trace_memory': self.trace_memory, 'summary': self.summary(), 'records': self.records},
+                      f, ensure_ascii=False, indent=1, default=repr)
+        with open(stem + '.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=RECORD_FIELDS)
+            writer.writeheader()
+            for r in self.records:
+                writer.writerow(dict(r, tags=json.dumps(r['tags'], ensure_ascii=False, default=repr)))
+        return stem + '.json', stem + '.csv'
+
+    def print_summary(self):
+        print(f"{'阶段':<22}{'次数':>6}{'wall s':>10}{'cpu s':>10}{'占比':>8}{'写出 MB':>10}{'内存峰值 MB':>12}")
+        for row in self.summary():
+            share = '' if row['share'] is None else f"{row['share']:.0%}"
+            mem = '' if row['mem_peak_mb'] is None else f"{row['mem_peak_mb']:.1f}"
+            print(f"{row['name']:<22}{row['count']:>6}{row['wall_s']:>10.2f}{row['cpu_s']:>10.2f}{share:>8}"
+                  f"{row['bytes'] / 2**20:>10.2f}{mem:>12}" + (f"  ({row['errors']} 次出错)" if row['errors'] else ''))
+
+
+# ---------- 模块级接口 ----------
+def enabled():
+    return _recorder is not None
+
+
+def stage(name, path=None, **tags):
+    """记录一个阶段；path 为该阶段写出的文件（结束时统计其大小）"""
+    if _recorder is None:
+        return _NULL
+    return _recorder.stage(name, path, **tags)
+
+
+def add_bytes(n):
+    """写到文件对象（而非路径）时手动计入字节数"""
+    if _recorder is not None:
+        _recorder.add_bytes(n)
+
+
+def timed(name=None, output=None):
+    """装饰器：把整个函数调用记为一个阶段；output 为输出路径所在的参数名"""
+    def decorate(func):
+        stage_name = name or func.__name__
+        signature = inspect.signature(func) if output else None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return func(*args, **kwargs)
+            path = signature.bind_partial(*args, **kwargs).arguments.get(output) if output else None
+            with _recorder.stage(stage_name, path):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _call_recorded(func, trace_memory, *args, **kwargs):
+    global _recorder
+    outer, _recorder = _recorder, Recorder(getattr(func, '__name__', 'task'), trace_memory)
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        records = _recorder.records
+        _recorder.close()
+        _recorder = outer
+    return result, records
+
+
+def worker(func):
+    """交给进程池的函数：开启记录时在子进程里同样记录，返回 (结果, 记录)，主进程用 unwrap 取回"""
+    if _recorder is None:
+        return func
+    return functools.partial(_call_recorded, func, _recorder.trace_memory)
+
+
+def unwrap(value, **tags):
+    """worker 包装过的任务结果：并入子进程的记录并返回原结果"""
+    if _recorder is None:
+        return value
+    result, records = value
+    _recorder.merge(records, **tags)
+    return result
+
+
+@contextmanager
+def run(name, enabled=None, trace_memory=None, output_dir=DEFAULT_REPORT_DIR):
+    """
+    包住 main() 的主体：结束时保存 JSON / CSV 报告并打印汇总表。
+    enabled / trace_memory 为 None 时由环境变量 NOISE_PROFILE 决定（见模块说明）。
+    """
+    global _recorder
+    setting = os.environ.get(PROFILE_ENV, '').strip().lower()
+    if enabled is None:
+        enabled = setting not in ('', '0', 'false', 'no', 'off')
+    if trace_memory is None:
+        trace_memory = setting == 'memory'
+    if not enabled:
+        yield None
+        return
+    outer, _recorder = _recorder, Recorder(name, trace_memory)
+    recorder = _recorder
+    try:
+        with recorder.stage(name):
+            yield recorder
+    finally:
+        _recorder = outer
+        recorder.close()
+        json_path, _ = recorder.save(output_dir)
+        recorder.print_summary()
+        print(f"运行报告已保存到 {json_path}（及同名 .csv）")
@@ -0,0 +1,152 @@
+"""
+按需求值的 Perlin 噪声场
+
+LazyNoise 只保存每个 octave 的梯度网格（很小），不生成整张场；
+取单点、点列表、矩形窗口或一行剖面时只计算被取到的像素，
+耗时与查询的像素数成正比，与场的大小无关。
+
+梯度的抽取顺序和每一步浮点运算都与 noisegen 相同，
+取到的值与 generate_seamless_perlin_noise_2d（normalize=True 时与 sweep.generate_job_noise）
+生成的整张场上对应位置的值逐位一致。
+归一化需要整张场的最小 / 最大值：第一次用到时分块流式算一遍（不占整张场的内存），之后复用；
+也可以直接传入 value_range。
+"""
+
+import numbers
+
+import numpy as np
+
+from noisegen import gradient_grid, lattice_axis, lattice_coords, octave_params, perlin_into, perlin_points, tile_slices
+
+
+class LazyNoise:
+    def __init__(self, shape, res, octaves=5, persistence=0.5, dtype=np.float64, rng=None,
+                 normalize=False, value_range=None):
+        """参数与 generate_seamless_perlin_noise_2d 相同；rng 为 None 时使用全局 np.random"""
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.normalize = normalize
+        self.params, self.max_amplitude = octave_params(res, octaves, persistence)
+        self.gradients = [gradient_grid((rx, ry), rng) for rx, ry, _ in self.params]
+        self._range = value_range
+
+    @classmethod
+    def from_job(cls, job, dtype=np.float64):
+        """与 sweep.generate_job_noise(job) 生成的（已归一化的）场一致"""
+        if job.get('engine', 'perlin') != 'perlin':
+            raise ValueError(f"只有 Perlin 噪声可以按需求值（任务的引擎为 {job['engine']}）")
+        return cls(job['shape'], job['res'], job['octaves'], job['persistence'], dtype=dtype,
+                   rng=np.random.default_rng(job['seed']), normalize=True)
+
+    @classmethod
+    def from_meta(cls, meta):
+        """由 FieldStore 的 .json 元数据重建（扫描脚本保存的场都已归一化）"""
+        params = meta.get('params', {})
+        if params.get('engine', 'perlin') != 'perlin':
+            raise ValueError(f"噪声场 {meta.get('name')} 由 {params['engine']} 引擎生成，只有 Perlin 噪声可以按需求值")
+        missing = [key for key in ('shape', 'res', 'octaves', 'persistence', 'seed') if key not in params]
+        if missing:
+            raise ValueError(f"噪声场 {meta.get('name')} 的元数据缺少 {missing}，无法按需求值")
+        seed = params['seed']
+        seed = np.random.SeedSequence(seed['entropy'], spawn_key=tuple(seed['spawn_key']))
+        return cls(params['shape'], params['res'], params['octaves'], params['persistence'],
+                   dtype=meta.get('dtype', np.float64), rng=np.random.default_rng(seed), normalize=True)
+
+    @property
+    def ndim(self):
+        return 2
+
+    # ---------- 未归一化的原始值 ----------
+    def _raw_points(self, rows, cols):
+        height, width = self.shape
+        out = np.zeros(rows.shape, dtype=self.dtype)
+        for gradients, (res_x, res_y, amplitude) in zip(self.gradients, self.params):
+            col_axis = lattice_coords(cols, width, res_y, res_x, self.dtype)
+            row_axis = lattice_coords(rows, height, res_x, res_y, self.dtype)
+            layer = perlin_points(gradients, col_axis, row_axis, self.dtype)
+            layer *= amplitude
+            out += layer
+        out /= self.max_amplitude
+        return out
+
+    def _raw_window(self, y, x, height, width):
+        out = np.zeros((height, width), dtype=self.dtype)
+        layer = np.empty_like(out)
+        scratch = tuple(np.empty_like(out) for _ in range(3))
+        for gradients, (res_x, res_y, amplitude) in zip(self.gradients, self.params):
+            col_axis = lattice_axis(self.shape[1], width, res_y, res_x, self.dtype, start=x)
+            row_axis = lattice_axis(self.shape[0], height, res_x, res_y, self.dtype, start=y)
+            perlin_into(gradients, col_axis, row_axis, layer, scratch)
+            layer *= amplitude
+            out += layer
+        out /= self.max_amplitude
+        return out
+
+    def value_range(self, tile=(1024, 1024)):
+        """整张原始场的 (最小值, 最大值)，分块流式计算一次后缓存"""
+        if self._range is None:
+            vmin, vmax = np.inf, -np.inf
+            for rows, cols in tile_slices(self.shape, tile):
+                block = self._raw_window(rows.start, cols.start, rows.stop - rows.start, cols.stop - cols.start)
+                vmin = min(vmin, block.min())
+                vmax = max(vmax, block.max())
+            self._range = (vmin, vmax)
+        return self._range
+
+    def _finish(self, values):
+        if not self.normalize:
+            return values
+        vmin, vmax = self.value_range()
+        return (values - vmin) / (vmax - vmin)
+
+    # ---------- 查询 ----------
+    def points(self, ys, xs):
+        """任意一组点的值，ys 为行、xs 为列（可广播的整数数组），越界抛出 IndexError"""
+        ys, xs = np.broadcast_arrays(self._check(ys, 0), self._check(xs, 1))
+        return self._finish(self._raw_points(ys.ravel(), xs.ravel())).reshape(ys.shape)
+
+    def window(self, y, x, height, width):
+        """矩形窗口，与 field[y:y+height, x:x+width] 相同"""
+        if y < 0 or x < 0 or y + height > self.shape[0] or x + width > self.shape[1]:
+            raise IndexError(f"窗口 ({y}, {x}, {height}, {width}) 超出噪声场 {self.shape}")
+        return self._finish(self._raw_window(y, x, height, width))
+
+    def segment(self, y, x, length):
+        """一行剖面，与 field[y, x:x+length] 相同"""
+        return self.window(y, x, 1, length)[0]
+
+    def materialize(self):
+        """整张场（与一次性生成的结果逐位一致）"""
+        return self.window(0, 0, *self.shape)
+
+    def __array__(self, dtype=None, copy=None):
+        field = self.materialize()
+        return field if dtype is None else field.astype(dtype)
+
+    def __getitem__(self, key):
+        """支持 field[y, x]、field[ys, xs]（整数数组）和 field[y0:y1, x0:x1]（切片 / 整数组合）"""
+        if not isinstance(key, tuple) or len(key) != 2:
+            raise IndexError("LazyNoise 需要两个下标：field[行, 列]")
+        if any(isinstance(k, slice) for k in key):
+            if not all(isinstance(k, (slice, numbers.Integral)) for k in key):
+                raise IndexError("切片不能和整数数组混用")
+            ranges = [range(*k.indices(n)) if isinstance(k, slice) else None for k, n in zip(key, self.shape)]
+            ys = np.arange(self.shape[0])[key[0]]
+            xs = np.arange(self.shape[1])[key[1]]
+            if all(r is None or r.step == 1 for r in ranges):
+                ys, xs = np.atleast_1d(ys), np.atleast_1d(xs)
+                block = self.window(int(ys[0]), int(xs[0]), len(ys), len(xs)) if ys.size and xs.size \
+                    else np.empty((ys.size, xs.size), dtype=self.dtype)
+            else:
+                block = self.points(np.atleast_1d(ys)[:, None], np.atleast_1d(xs)[None, :])
+            return block[tuple(0 if r is None else slice(None) for r in ranges)]
+        return self.points(*key)
+
+    def _check(self, index, axis):
+        index = np.asarray(index)
+        if not np.issubdtype(index.dtype, np.integer):
+            raise IndexError("下标必须是整数")
+        n = self.shape[axis]
+        if index.size and (index.min() < -n or index.max() >= n):
+            raise IndexError(f"下标超出第 {axis} 维的范围 {n}")
+        return np.where(index < 0, index + n, index)
@@ -0,0 +1,355 @@
+"""
+噪声生成引擎（makeimg.py / exp1 等脚本共用）
+
+与原来每个脚本里复制的 generate_seamless_perlin_noise_2d 结果一致，但：
+- 一次调用可生成 N 张噪声场，返回 (N, H, W) 数组
+- 坐标只用按行/按列的一维向量，不再每个 octave 构造 meshgrid
+- 每个 octave 只复用 4 块 (H, W) 的临时缓冲区，全部原地计算
+- 支持 dtype（如 float32）和 out= 输出缓冲区
+- 超大噪声场可按 tile 分块生成，直接写入磁盘上的 .npy（np.memmap）
+
+另有频谱合成引擎（spectralnoise.py）和 Numba 编译的融合内核（perlin_fused），接口相同，
+用 noise_engine(name) 按名字选择。
+"""
+
+import os
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # 没有安装 numba 时 perlin_fused 引擎回退到 NumPy 实现
+    numba = None
+
+import instrument
+from spectralnoise import generate_spectral_noise_2d
+
+# 生成算法改变（结果不再逐位一致）时加 1，fieldcache 会据此让旧缓存失效
+ENGINE_VERSION = 1
+
+
+def fade(t):
+    return 6 * t**5 - 15 * t**4 + 10 * t**3
+
+
+def gradient_grid(res, rng=None):
+    """随机梯度网格 (res[0], res[1], 2)；rng 为 None 时使用全局 np.random"""
+    if rng is None:
+        angles = 2 * np.pi * np.random.rand(res[0], res[1])
+    else:
+        angles = 2 * np.pi * rng.random((res[0], res[1]))
+    return np.dstack((np.cos(angles), np.sin(angles)))
+
+
+def octave_params(res, octaves, persistence):
+    """每个 octave 的 (res_x, res_y, amplitude)，以及总振幅"""
+    params = []
+    frequency = 1
+    amplitude = 1
+    max_amplitude = 0
+    for _ in range(octaves):
+        params.append((int(res[0] * frequency), int(res[1] * frequency), amplitude))
+        max_amplitude += amplitude
+        amplitude *= persistence
+        frequency *= 2
+    return params, max_amplitude
+
+
+def lattice_axis(n, count, cells, cells_mod, dtype, start=0):
+    """
+    一维坐标向量：第 start..start+count-1 个像素在 cells 个格子上的位置。
+    返回 (i0, i1, d, s)：左右格点下标、格内偏移、fade 后的插值权重。
+    与原来的 meshgrid 写法逐元素相同（包括取模方式）。
+    """
+    return lattice_coords(np.arange(start, start + count), n, cells, cells_mod, dtype)
+
+
+def lattice_coords(index, n, cells, cells_mod, dtype):
+    """同 lattice_axis，但像素下标 index 可以是任意整数数组（按点求值时用）"""
+    t = np.asarray(index) * (cells / n)
+    i0 = np.floor(t).astype(int) % cells_mod
+    i1 = (i0 + 1) % cells_mod
+    d = t - i0
+    return i0, i1, d.astype(dtype), fade(d).astype(dtype)
+
+
+def perlin_into(gradients, cols, rows, out, scratch):
+    """
+    在 out (h, w) 中原地计算一层 Perlin 噪声。
+    cols / rows 为 lattice_axis 的结果（x 沿列，y 沿行），scratch 为 3 块同形缓冲区。
+    """
+    x0, x1, dx, sx = cols
+    y0, y1, dy, sy = rows
+    b, c, t = scratch
+    dx = dx[None, :]
+    sx = sx[None, :]
+    dy = dy[:, None]
+    sy = sy[:, None]
+    dx1 = dx - 1
+    dy1 = dy - 1
+
+    # gradients[x0, y0] 中 x 随列变、y 随行变，先按行取出小表再按列 take
+    gx = gradients[..., 0].T.astype(out.dtype)
+    gy = gradients[..., 1].T.astype(out.dtype)
+    gx_y0, gx_y1 = gx[y0], gx[y1]
+    gy_y0, gy_y1 = gy[y0], gy[y1]
+
+    # n00 -> out
+    np.take(gx_y0, x0, axis=1, out=out)
+    out *= dx
+    np.take(gy_y0, x0, axis=1, out=t)
+    t *= dy
+    out += t
+    # n10 -> b
+    np.take(gx_y0, x1, axis=1, out=b)
+    b *= dx1
+    np.take(gy_y0, x1, axis=1, out=t)
+    t *= dy
+    b += t
+    # nx0 = (1 - sx) * n00 + sx * n10
+    out *= 1 - sx
+    b *= sx
+    out += b
+
+    # n01 -> b
+    np.take(gx_y1, x0, axis=1, out=b)
+    b *= dx
+    np.take(gy_y1, x0, axis=1, out=t)
+    t *= dy1
+    b += t
+    # n11 -> c
+    np.take(gx_y1, x1, axis=1, out=c)
+    c *= dx1
+    np.take(gy_y1, x1, axis=1, out=t)
+    t *= dy1
+    c += t
+    # nx1 = (1 - sx) * n01 + sx * n11
+    b *= 1 - sx
+    c *= sx
+    b += c
+
+    # (1 - sy) * nx0 + sy * nx1
+    out *= 1 - sy
+    b *= sy
+    out += b
+    return out
+
+
+def perlin_points(gradients, cols, rows, dtype):
+    """
+    逐点计算一层 Perlin 噪声：第 i 个点取 cols / rows 的第 i 项（而不是行列组合）。
+    运算顺序与 perlin_into 完全相同，结果与整张场上对应位置的值逐位一致。
+    """
+    x0, x1, dx, sx = cols
+    y0, y1, dy, sy = rows
+    gx = gradients[..., 0].T.astype(dtype)
+    gy = gradients[..., 1].T.astype(dtype)
+    dx1 = dx - 1
+    dy1 = dy - 1
+    nx0 = (gx[y0, x0] * dx + gy[y0, x0] * dy) * (1 - sx) + (gx[y0, x1] * dx1 + gy[y0, x1] * dy) * sx
+    nx1 = (gx[y1, x0] * dx + gy[y1, x0] * dy1) * (1 - sx) + (gx[y1, x1] * dx1 + gy[y1, x1] * dy1) * sx
+    return nx0 * (1 - sy) + nx1 * sy
+
+
+def generate_perlin_noise_batch(n, shape, res, octaves=5, persistence=0.5,
+                                dtype=np.float64, out=None, rng=None):
+    """
+    一次生成 n 张无缝 Perlin 噪声，返回 (n, H, W)。
+    - dtype: 输出精度，float32 可减半内存和带宽
+    - out:   可选的 (n, H, W) 输出缓冲区（如 np.memmap）
+    - rng:   np.random.Generator；None 时使用全局 np.random（与旧脚本一致）
+    梯度的抽取顺序与逐张调用旧函数相同，因此同一随机状态下结果逐位一致。
+    """
+    dtype = np.dtype(dtype)
+    height, width = shape
+    if out is None:
+        out = np.zeros((n, height, width), dtype=dtype)
+    else:
+        if out.shape != (n, height, width):
+            raise ValueError(f"out 的形状应为 {(n, height, width)}，实际为 {out.shape}")
+        dtype = out.dtype
+        out[...] = 0
+
+    params, max_amplitude = octave_params(res, octaves, persistence)
+    # 先按 “逐张、逐 octave” 的顺序抽取全部梯度（很小），保证随机流与旧代码一致
+    all_gradients = [[gradient_grid((rx, ry), rng) for rx, ry, _ in params] for _ in range(n)]
+
+    layer = np.empty((height, width), dtype=dtype)
+    scratch = tuple(np.empty((height, width), dtype=dtype) for _ in range(3))
+    for k, (res_x, res_y, amplitude) in enumerate(params):
+        cols = lattice_axis(width, width, res_y, res_x, dtype)
+        rows = lattice_axis(height, height, res_x, res_y, dtype)
+        for idx in range(n):
+            perlin_into(all_gradients[idx][k], cols, rows, layer, scratch)
+            layer *= amplitude
+            out[idx] += layer
+
+    out /= max_amplitude
+    return out
+
+
+def _fused_octaves(gx, gy, offsets, cells_y, amplitudes, cols, rows, max_amplitude, out):
+    """
+    逐像素把所有 octave 一次算完：每个像素只读几个格点梯度，不产生任何整张场大小的临时数组。
+    cols / rows 为各 octave 的 lattice_axis 结果（小的一维表），按行并行。
+    运算与 perlin_into 相同，结果在浮点误差范围内一致。
+    """
+    x0s, x1s, dxs, sxs = cols
+    y0s, y1s, dys, sys_ = rows
+    height, width = out.shape
+    for i in prange(height):
+        for j in range(width):
+            acc = 0.0
+            for k in range(amplitudes.shape[0]):
+                x0, x1, dx, sx = x0s[k, j], x1s[k, j], dxs[k, j], sxs[k, j]
+                y0, y1, dy, sy = y0s[k, i], y1s[k, i], dys[k, i], sys_[k, i]
+                # 梯度网格 (res_x, res_y, 2) 按行优先展平，g[x, y] 在 offset + x * res_y + y
+                a00 = offsets[k] + x0 * cells_y[k] + y0
+                a10 = offsets[k] + x1 * cells_y[k] + y0
+                a01 = offsets[k] + x0 * cells_y[k] + y1
+                a11 = offsets[k] + x1 * cells_y[k] + y1
+                nx0 = (gx[a00] * dx + gy[a00] * dy) * (1 - sx) + (gx[a10] * (dx - 1) + gy[a10] * dy) * sx
+                nx1 = ((gx[a01] * dx + gy[a01] * (dy - 1)) * (1 - sx)
+                       + (gx[a11] * (dx - 1) + gy[a11] * (dy - 1)) * sx)
+                acc += (nx0 * (1 - sy) + nx1 * sy) * amplitudes[k]
+            out[i, j] = acc / max_amplitude
+    return out
+
+
+if numba is not None:
+    prange = numba.prange
+    _fused_kernel = numba.njit(parallel=True, cache=True)(_fused_octaves)
+else:
+    prange = range
+    _fused_kernel = None
+
+
+@instrument.timed('noise')
+def generate_perlin_noise_fused(shape, res, octaves=5, persistence=0.5,
+                                dtype=np.float64, out=None, rng=None, tile=None, filepath=None):
+    """
+    接口与 generate_seamless_perlin_noise_2d 相同的编译后端（需要 numba）：
+    所有 octave 在一个多线程循环里逐像素融合计算，内存只有输出本身。
+    梯度抽取顺序与 NumPy 实现相同，结果在浮点误差范围内一致。
+    没有安装 numba，或使用分块模式时，直接调用 NumPy 实现。
+    """
+    if _fused_kernel is None or tile is not None:
+        return generate_seamless_perlin_noise_2d(shape, res, octaves, persistence, dtype=dtype, out=out,
+                                                 rng=rng, tile=tile, filepath=filepath)
+    dtype = np.dtype(dtype) if out is None else out.dtype
+    height, width = shape
+    params, max_amplitude = octave_params(res, octaves, persistence)
+    gradients = [gradient_grid((rx, ry), rng) for rx, ry, _ in params]
+    sizes = [g.shape[0] * g.shape[1] for g in gradients]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.intp)
+    gx = np.concatenate([g[..., 0].ravel() for g in gradients]).astype(dtype)
+    gy = np.concatenate([g[..., 1].ravel() for g in gradients]).astype(dtype)
+    cells_y = np.array([ry for _, ry, _ in params], dtype=np.intp)
+    amplitudes = np.array([a for _, _, a in params], dtype=dtype)
+    # 各 octave 的行 / 列坐标表与 NumPy 实现共用 lattice_axis，只有 (octaves, W) 和 (octaves, H) 大小
+    cols = [np.stack(parts) for parts in zip(*(lattice_axis(width, width, ry, rx, dtype) for rx, ry, _ in params))]
+    rows = [np.stack(parts) for parts in zip(*(lattice_axis(height, height, rx, ry, dtype) for rx, ry, _ in params))]
+    if out is None:
+        out = np.empty((height, width), dtype=dtype)
+    return _fused_kernel(gx, gy, offsets, cells_y, amplitudes, tuple(cols), tuple(rows), max_amplitude, out)
+
+
+def tile_slices(shape, tile):
+    """按行优先顺序遍历所有 tile，返回 (行 slice, 列 slice)"""
+    for r in range(0, shape[0], tile[0]):
+        for c in range(0, shape[1], tile[1]):
+            yield slice(r, min(r + tile[0], shape[0])), slice(c, min(c + tile[1], shape[1]))
+
+
+def normalize_tiled(data, tile=(1024, 1024)):
+    """
+    逐 tile 原地归一化到 [0, 1]：第一遍流式求 min/max，第二遍写回。
+    结果与 (data - data.min()) / (data.max() - data.min()) 逐位一致。
+    """
+    vmin, vmax = np.inf, -np.inf
+    for rows, cols in tile_slices(data.shape, tile):
+        block = data[rows, cols]
+        vmin = min(vmin, block.min())
+        vmax = max(vmax, block.max())
+    for rows, cols in tile_slices(data.shape, tile):
+        block = data[rows, cols]
+        data[rows, cols] = (block - vmin) / (vmax - vmin)
+    if isinstance(data, np.memmap):
+        data.flush()
+    return data
+
+
+def generate_perlin_noise_tiled(shape, res, filepath, octaves=5, persistence=0.5,
+                                tile=(1024, 1024), dtype=np.float64, rng=None, normalize=False):
+    """
+    分块生成超大噪声场，每个 tile 算完直接写入 filepath (.npy, np.memmap)。
+    内存只与 tile 大小有关；结果与内存版 generate_seamless_perlin_noise_2d 逐位一致。
+    normalize=True 时再流式地归一化到 [0, 1]。
+    返回以 r+ 模式打开的 memmap。
+    """
+    dtype = np.dtype(dtype)
+    height, width = shape
+    tile_h, tile_w = min(tile[0], height), min(tile[1], width)
+
+    params, max_amplitude = octave_params(res, octaves, persistence)
+    gradients = [gradient_grid((rx, ry), rng) for rx, ry, _ in params]
+
+    folder = os.path.dirname(filepath)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    out = np.lib.format.open_memmap(filepath, mode='w+', dtype=dtype, shape=(height, width))
+
+    # tile 缓冲区按一维分配，边缘的小 tile 取前缀再 reshape，保证连续
+    flat = [np.empty(tile_h * tile_w, dtype=dtype) for _ in range(5)]
+    for rows, cols in tile_slices(shape, (tile_h, tile_w)):
+        h, w = rows.stop - rows.start, cols.stop - cols.start
+        acc, layer, *scratch = (buf[:h * w].reshape(h, w) for buf in flat)
+        acc[...] = 0
+        for k, (res_x, res_y, amplitude) in enumerate(params):
+            col_axis = lattice_axis(width, w, res_y, res_x, dtype, start=cols.start)
+            row_axis = lattice_axis(height, h, res_x, res_y, dtype, start=rows.start)
+            perlin_into(gradients[k], col_axis, row_axis, layer, scratch)
+            layer *= amplitude
+            acc += layer
+        acc /= max_amplitude
+        out[rows, cols] = acc
+    out.flush()
+
+    if normalize:
+        normalize_tiled(out, (tile_h, tile_w))
+    return out
+
+
+@instrument.timed('noise')
+def generate_seamless_perlin_noise_2d(shape, res, octaves=5, persistence=0.5,
+                                      dtype=np.float64, out=None, rng=None, tile=None, filepath=None):
+    """
+    单张版本，接口与旧函数兼容；out 为 (H, W) 缓冲区。
+    给定 tile 时改用分块模式，结果写入 filepath 并返回 memmap。
+    """
+    if tile is not None:
+        if filepath is None:
+            raise ValueError("分块模式需要指定 filepath")
+        return generate_perlin_noise_tiled(shape, res, filepath, octaves, persistence,
+                                           tile=tile, dtype=dtype, rng=rng)
+    batch_out = None if out is None else out[np.newaxis]
+    return generate_perlin_noise_batch(1, shape, res, octaves, persistence,
+                                       dtype=dtype, out=batch_out, rng=rng)[0]
+
+
+# 可选的噪声引擎，调用方式相同
+ENGINES = {
+    'perlin': generate_seamless_perlin_noise_2d,
+    'spectral': generate_spectral_noise_2d,
+    'perlin_fused': generate_perlin_noise_fused,
+}
+
+
+def noise_engine(name='perlin'):
+    """
+    按名字取噪声生成函数：'perlin'（默认）、'spectral'（FFT 频谱合成 1/f^β 噪声）
+    或 'perlin_fused'（Numba 融合内核，与 'perlin' 在浮点误差范围内一致，没有 numba 时等同 'perlin'）
+    """
+    if name not in ENGINES:
+        raise ValueError(f"未知的噪声引擎: {name}（可选 {sorted(ENGINES)}）")
+    return ENGINES[name]
@@ -0,0 +1,166 @@
+"""
+置换表梯度噪声（经典 Perlin 的哈希写法），支持 2D 和 3D (x, y, t)
+
+noisegen 每次调用都用 np.random 重新抽一张梯度网格，场无法在时间上延伸，也不能分块重算。
+这里的梯度由种子决定的置换表按格点坐标哈希得到：
+- 同一个种子、同一个坐标永远得到同一个值，任意窗口可以单独重算，与整张场切片逐位一致
+- 2D 用 8 个方向的单位梯度，3D 用改进 Perlin 噪声的 12 个棱方向梯度
+- 每个 octave 的格点坐标按该层的格子数取模，空间上无缝；给定 time_period 时时间上也首尾相接
+- frames() 逐帧产出 (x, y, t) 体数据的切片，内存只与单帧大小有关，不生成也不保存整个体
+"""
+
+import os
+
+import numpy as np
+
+import instrument
+from excelwriter import palette_indices
+from raster import apply_lut, colormap_lut, write_png
+
+GRAD2 = np.array([(np.cos(a), np.sin(a)) for a in np.arange(8) * np.pi / 4])
+GRAD3 = np.array([(1, 1, 0), (-1, 1, 0), (1, -1, 0), (-1, -1, 0),
+                  (1, 0, 1), (-1, 0, 1), (1, 0, -1), (-1, 0, -1),
+                  (0, 1, 1), (0, -1, 1), (0, 1, -1), (0, -1, -1)], dtype=np.float64)
+
+
+def fade(t):
+    return 6 * t**5 - 15 * t**4 + 10 * t**3
+
+
+def lerp(t, a, b):
+    return a + t * (b - a)
+
+
+class PermutationNoise:
+    def __init__(self, seed=0, size=256):
+        """size: 置换表长度，也是每个方向上格点坐标的最大周期"""
+        self.seed = seed
+        self.size = size
+        perm = np.random.default_rng(seed).permutation(size)
+        self.perm = np.concatenate([perm, perm])  # 两份拼接，perm[h + i] 不必再取模
+
+    def _lattice(self, coord, period):
+        """坐标 -> (左格点, 右格点, 格内偏移)，格点按 period（默认 size）取模"""
+        period = self.size if period is None else period
+        if period > self.size:
+            raise ValueError(f"周期 {period} 超过置换表长度 {self.size}，请增大 size")
+        cell = np.floor(coord)
+        i0 = cell.astype(np.intp) % period
+        return i0, (i0 + 1) % period, coord - cell
+
+    def noise2(self, x, y, period=(None, None)):
+        """单层 2D 噪声，x / y 为可广播的浮点坐标（单位：格子），period 为 (x 方向, y 方向) 的格子数"""
+        x0, x1, dx = self._lattice(np.asarray(x, dtype=np.float64), period[0])
+        y0, y1, dy = self._lattice(np.asarray(y, dtype=np.float64), period[1])
+        perm = self.perm
+
+        def corner(xi, yi, px, py):
+            h = perm[perm[xi] + yi] & 7
+            return GRAD2[h, 0] * px + GRAD2[h, 1] * py
+
+        u, v = fade(dx), fade(dy)
+        nx0 = lerp(u, corner(x0, y0, dx, dy), corner(x1, y0, dx - 1, dy))
+        nx1 = lerp(u, corner(x0, y1, dx, dy - 1), corner(x1, y1, dx - 1, dy - 1))
+        return lerp(v, nx0, nx1)
+
+    def noise3(self, x, y, t, period=(None, None, None)):
+        """单层 3D 噪声，第三维通常是时间"""
+        x0, x1, dx = self._lattice(np.asarray(x, dtype=np.float64), period[0])
+        y0, y1, dy = self._lattice(np.asarray(y, dtype=np.float64), period[1])
+        t0, t1, dt = self._lattice(np.asarray(t, dtype=np.float64), period[2])
+        perm = self.perm
+
+        def corner(xi, yi, ti, px, py, pt):
+            h = perm[perm[perm[xi] + yi] + ti] % 12
+            return GRAD3[h, 0] * px + GRAD3[h, 1] * py + GRAD3[h, 2] * pt
+
+        u, v, w = fade(dx), fade(dy), fade(dt)
+        layers = []
+        for ti, pt in ((t0, dt), (t1, dt - 1)):
+            nx0 = lerp(u, corner(x0, y0, ti, dx, dy, pt), corner(x1, y0, ti, dx - 1, dy, pt))
+            nx1 = lerp(u, corner(x0, y1, ti, dx, dy - 1, pt), corner(x1, y1, ti, dx - 1, dy - 1, pt))
+            layers.append(lerp(v, nx0, nx1))
+        return lerp(w, layers[0], layers[1])
+
+    def fractal(self, shape, res, octaves=5, persistence=0.5, t=None, time_period=None,
+                window=None, dtype=np.float64):
+        """
+        多 octave 叠加的无缝噪声场，res 的含义与 generate_seamless_perlin_noise_2d 相同
+        （res[0] 为沿行方向的格子数，res[1] 为沿列方向），每个 octave 频率翻倍。
+        - t: 时间坐标（单位：最低 octave 的格子），None 为 2D 噪声
+        - time_period: 时间方向的周期（格子数），给定时第 time_period 格回到起点，可循环播放
+        - window: (y, x, height, width)，只计算该矩形，与整张场的切片逐位一致
+        已除以各层振幅之和，理论上在 [-1, 1] 内，实际基本落在 ±0.5 以内
+        """
+        height, width = shape
+        y0, x0, h, w = window if window is not None else (0, 0, height, width)
+        rows = np.arange(y0, y0 + h)[:, None]
+        cols = np.arange(x0, x0 + w)[None, :]
+        out = np.zeros((h, w))
+        amplitude, max_amplitude = 1.0, 0.0
+        for k in range(octaves):
+            frequency = 2 ** k
+            cells_y, cells_x = int(res[0] * frequency), int(res[1] * frequency)
+            y = rows * (cells_y / height)
+            x = cols * (cells_x / width)
+            if t is None:
+                layer = self.noise2(x, y, period=(cells_x, cells_y))
+            else:
+                t_period = None if time_period is None else int(time_period * frequency)
+                layer = self.noise3(x, y, t * frequency, period=(cells_x, cells_y, t_period))
+            out += amplitude * layer
+            max_amplitude += amplitude
+            amplitude *= persistence
+        out /= max_amplitude
+        return out.astype(dtype, copy=False)
+
+    def frames(self, shape, res, n_frames, octaves=5, persistence=0.5, frames_per_cell=24, start=0,
+               time_period=None, dtype=np.float64):
+        """
+        逐帧产出 (x, y, t) 噪声体的切片：第 k 帧的时间坐标为 k / frames_per_cell。
+        每帧单独计算，内存只占一帧；从 start 开始可以接着之前的帧继续生成。
+        """
+        for k in range(start, start + n_frames):
+            yield self.fractal(shape, res, octaves, persistence, t=k / frames_per_cell,
+                               time_period=time_period, dtype=dtype)
+
+
+@instrument.timed('animated_frames')
+def save_frames(frames, output_dir, colormap='gray', value_range=(-0.5, 0.5), prefix='Frame'):
+    """
+    逐帧着色写出 PNG。所有帧用同一个固定的 value_range 归一化
+    （逐帧按 min/max 归一化会让亮度随帧闪烁），超出范围的值截断。返回文件路径列表。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    lut = colormap_lut(colormap)
+    vmin, vmax = value_range
+    paths = []
+    for k, frame in enumerate(frames):
+        normalized = np.clip((frame - vmin) / (vmax - vmin), 0, 1)
+        path = os.path.join(output_dir, f"{prefix}_{colormap}_{k:04d}.png")
+        write_png(apply_lut(palette_indices(normalized, len(lut)), lut), path)
+        paths.append(path)
+    return paths
+
+
+def main():
+    shape = (630, 820)       # 图像大小
+    res = (3, 3)             # 基础网格分辨率
+    octaves = 5
+    n_frames = 96            # 帧数
+    frames_per_cell = 24     # 时间上走过一个格子用多少帧（越大变化越慢）
+    time_period = 4          # 时间方向 4 个格子后回到起点（96 帧循环播放无跳变）；None 为不循环
+    seed = 0
+    colormap = 'gray'
+    output_dir = r'../color/animated'
+
+    with instrument.run('permnoise'):
+        noise = PermutationNoise(seed)
+        frames = noise.frames(shape, res, n_frames, octaves, frames_per_cell=frames_per_cell,
+                              time_period=time_period)
+        paths = save_frames(frames, os.path.join(output_dir, colormap), colormap)
+    print(f"已保存 {len(paths)} 帧到 {os.path.join(output_dir, colormap)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+剖面曲线引擎（exp3）
+
+一张噪声场上所有可用的水平剖面（长度 length，默认 351 个采样点）用 sliding_window_view
+组成一个 (行, 起点列, length) 的零拷贝视图，不复制数据。
+每段的和 / 平方和由按行累加和一次求出；与真实剖面的滑动点积用 FFT 卷积一次算完，
+由此向量化得到所有候选段与真实剖面的相关系数和 RMSE，
+再在指定的相似度区间里直接挑选干扰曲线，不再盲目地重复随机抽样。
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import fftconvolve
+
+import instrument
+
+
+def _window_sums(field, length):
+    """每行长度为 length 的滑动窗口和，结果 [y, x] 对应 field[y, x:x+length]"""
+    csum = np.zeros((field.shape[0], field.shape[1] + 1))
+    np.cumsum(field, axis=1, out=csum[:, 1:])
+    return csum[:, length:] - csum[:, :-length]
+
+
+class ProfileIndex:
+    @instrument.timed('profile_index')
+    def __init__(self, field, length=351, margin=30):
+        """
+        候选起点与 exp3 原来的取值范围一致：
+        行 y ∈ [margin, H - margin]，起点列 x ∈ [margin, W - length - margin]
+        """
+        field = np.asarray(field, dtype=np.float64)
+        height, width = field.shape
+        self.field = field
+        self.length = length
+        self.margin = margin
+        self.rows = np.arange(margin, min(height - margin, height - 1) + 1)
+        self.cols = np.arange(margin, width - length - margin + 1)
+        if self.rows.size == 0 or self.cols.size == 0:
+            raise ValueError(f"噪声场 {field.shape} 太小，放不下长度为 {length} 的剖面")
+
+        row_slice = slice(self.rows[0], self.rows[-1] + 1)
+        col_slice = slice(self.cols[0], self.cols[-1] + 1)
+        self._row_slice = row_slice
+        self._col_slice = col_slice
+        # 所有候选剖面，segments[i, j] 即 field[rows[i], cols[j]:cols[j]+length]
+        self.segments = sliding_window_view(field, length, axis=1)[row_slice, col_slice]
+
+        mean = _window_sums(field, length)[row_slice, col_slice] / length
+        mean_sq = _window_sums(field * field, length)[row_slice, col_slice] / length
+        self._sum_sq = mean_sq * length
+        self._mean = mean
+        self._std = np.sqrt(np.maximum(mean_sq - mean * mean, 0))
+
+    def profile(self, x, y):
+        """以 (x, y) 为起点（列、行）的剖面，是 field 的视图"""
+        return self.field[y, x:x + self.length]
+
+    def random_position(self, rng=None):
+        rng = np.random.default_rng(rng)
+        return int(rng.choice(self.cols)), int(rng.choice(self.rows))
+
+    def similarity(self, profile):
+        """
+        所有候选段与 profile 的相关系数和 RMSE，形状均为 (len(rows), len(cols))。
+        滑动点积用 FFT 卷积（翻转后的 profile）一次算出。
+        """
+        profile = np.asarray(profile, dtype=np.float64)
+        n = self.length
+        dot = fftconvolve(self.field[self._row_slice], profile[None, ::-1], mode='valid', axes=1)
+        dot = dot[:, self._col_slice]
+
+        p_mean = profile.mean()
+        p_std = profile.std()
+        denom = n * self._std * p_std
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = (dot - n * self._mean * p_mean) / denom
+        corr[denom == 0] = 0
+        np.clip(corr, -1, 1, out=corr)
+
+        mse = (self._sum_sq - 2 * dot + profile @ profile) / n
+        rmse = np.sqrt(np.maximum(mse, 0))
+        return corr, rmse
+
+    @instrument.timed('distractors')
+    def pick_distractors(self, x, y, n=5, corr_band=None, rmse_band=None, min_distance=5, rng=None):
+        """
+        为以 (x, y) 为起点的真实剖面挑选 n 条干扰剖面。
+        - corr_band / rmse_band: (下限, 上限)，只在该相似度区间里挑选，None 表示不限制
+        - min_distance: 起点与真实剖面及彼此之间在行、列上都至少相差这么多像素，
+          避免挑到只平移了一两个像素、几乎相同的曲线
+        返回 dict，各项为长度 n 的数组：x, y, corr, rmse
+        """
+        rng = np.random.default_rng(rng)
+        corr, rmse = self.similarity(self.profile(x, y))
+        keep = np.ones(corr.shape, dtype=bool)
+        if corr_band is not None:
+            keep &= (corr >= corr_band[0]) & (corr <= corr_band[1])
+        if rmse_band is not None:
+            keep &= (rmse >= rmse_band[0]) & (rmse <= rmse_band[1])
+
+        row_idx, col_idx = np.nonzero(keep)
+        cand_y = self.rows[row_idx]
+        cand_x = self.cols[col_idx]
+        far = (np.abs(cand_y - y) > min_distance) | (np.abs(cand_x - x) > min_distance)
+        order = rng.permutation(np.flatnonzero(far))
+
+        chosen = []
+        for k in order:
+            cx, cy = cand_x[k], cand_y[k]
+            if all(abs(cy - py) > min_distance or abs(cx - px) > min_distance for px, py in chosen):
+                chosen.append((cx, cy))
+                if len(chosen) == n:
+                    break
+        if len(chosen) < n:
+            raise RuntimeError(f"相似度区间内只找到 {len(chosen)}/{n} 条干扰剖面，"
+                               f"请放宽 corr_band / rmse_band")
+
+        picked_x = np.array([c[0] for c in chosen])
+        picked_y = np.array([c[1] for c in chosen])
+        i = np.searchsorted(self.rows, picked_y)
+        j = np.searchsorted(self.cols, picked_x)
+        return {'x': picked_x, 'y': picked_y, 'corr': corr[i, j], 'rmse': rmse[i, j]}
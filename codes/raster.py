@@ -0,0 +1,90 @@
+"""
+标量场直接栅格化为 PNG，不经过 matplotlib 的 figure / imshow / savefig
+
+数据只归一化一次得到 uint8/uint16 的调色板下标，每种 colormap 只是一次查表（gather），
+再直接编码成 PNG，输出尺寸严格等于 H×W，没有重采样，也不需要 1e-9 的 figsize 修正。
+"""
+
+import struct
+import zlib
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+import instrument
+from excelwriter import palette_indices
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def colormap_lut(colormap, levels=None):
+    """(N, 3) uint8 查找表，与 matplotlib cmap(..., bytes=True) 的颜色相同"""
+    cmap = plt.get_cmap(colormap)
+    if levels is not None:
+        cmap = cmap.resampled(levels)
+    return cmap(np.arange(cmap.N), bytes=True)[:, :3]
+
+
+def field_indices(noise, levels=256):
+    """按 min/max 归一化并量化为调色板下标（levels <= 256 时为 uint8，否则 uint16）"""
+    noise = np.asarray(noise, dtype=np.float64)
+    vmin, vmax = noise.min(), noise.max()
+    normalized = (noise - vmin) / (vmax - vmin) if vmax > vmin else np.zeros_like(noise)
+    dtype = np.uint8 if levels <= 256 else np.uint16
+    return palette_indices(normalized, levels).astype(dtype)
+
+
+def apply_lut(indices, lut):
+    """下标 -> RGB 像素 (H, W, 3)"""
+    return np.take(lut, indices, axis=0)
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def encode_png(pixels, compress_level=6):
+    """把 (H, W) 灰度或 (H, W, 3) RGB 的 uint8 数组编码为 PNG 字节串"""
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+    height, width = pixels.shape[:2]
+    color_type = 2 if pixels.ndim == 3 else 0
+    # 每行前加一个滤波类型字节（0 = None）
+    raw = np.zeros((height, 1 + pixels[0].size), dtype=np.uint8)
+    raw[:, 1:] = pixels.reshape(height, -1)
+    header = struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)
+    return (PNG_SIGNATURE
+            + _png_chunk(b'IHDR', header)
+            + _png_chunk(b'IDAT', zlib.compress(raw.tobytes(), compress_level))
+            + _png_chunk(b'IEND', b''))
+
+
+@instrument.timed('png', output='target')
+def write_png(pixels, target, compress_level=6):
+    """target 为文件路径或可写的二进制文件对象（如 io.BytesIO）"""
+    data = encode_png(pixels, compress_level)
+    if hasattr(target, 'write'):
+        target.write(data)
+    else:
+        with open(target, 'wb') as f:
+            f.write(data)
+    return target
+
+
+def render_scalar_field(noise, colormap, levels=256):
+    """返回着色后的 RGB 像素 (H, W, 3)"""
+    return apply_lut(field_indices(noise, levels), colormap_lut(colormap, levels))
+
+
+def save_scalar_field_png(noise, colormap, filepath, levels=256):
+    return write_png(render_scalar_field(noise, colormap, levels), filepath)
+
+
+def save_scalar_field_pngs(noise, targets, levels=256):
+    """
+    一次遍历数据输出多种 colormap：targets 为 {colormap: 文件路径或文件对象}。
+    归一化和量化只做一次，每种 colormap 只是一次查表 + PNG 编码。
+    """
+    indices = field_indices(noise, levels)
+    for colormap, target in targets.items():
+        write_png(apply_lut(indices, colormap_lut(colormap, levels)), target)
+    return targets
@@ -0,0 +1,143 @@
+"""
+共享内存渲染池：一张噪声场的所有 colormap / 输出类型并行渲染
+
+原来每张场的 gray / rainbow / hot × (带 colorbar 的图、纯标量场图、染色 Excel) 在一个进程里依次输出。
+这里把每张归一化后的场只写入 multiprocessing.shared_memory 一次，
+渲染子进程（Agg 后端）按名字 attach，直接在共享内存上建 ndarray，零拷贝，
+提交任务时只传 (名字, 形状, dtype)，数组本身不经过 pickle。
+每个产物（一个文件）是一个独立任务，完成一个报告一个；一张场的产物全部完成后立即释放它的共享内存。
+"""
+
+import gc
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import instrument
+
+
+class SharedField:
+    def __init__(self, noise, normalize=True):
+        """在主进程中创建：场（按需 min/max 归一化到 [0, 1]）写入一块新的共享内存"""
+        noise = np.asarray(noise)
+        dtype = noise.dtype if np.issubdtype(noise.dtype, np.floating) else np.dtype(np.float64)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(noise.size * dtype.itemsize, 1))
+        self.array = np.ndarray(noise.shape, dtype=dtype, buffer=self._shm.buf)
+        if normalize:
+            vmin, vmax = noise.min(), noise.max()
+            np.subtract(noise, vmin, out=self.array)
+            self.array /= vmax - vmin
+        else:
+            self.array[...] = noise
+        # 子进程 attach 所需的全部信息
+        self.spec = (self._shm.name, noise.shape, dtype.str)
+
+    def release(self):
+        """关闭并删除共享内存（子进程里已 attach 的映射不受影响，全部关闭后系统回收）"""
+        if self._shm is None:
+            return
+        self.array = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+
+def _init_worker():
+    """渲染子进程：非交互的 Agg 后端"""
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def render_artifact(spec, func, args, kwargs):
+    """子进程中执行：attach 共享内存，调用 func(场, *args, **kwargs)，返回耗时"""
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    field = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    field.flags.writeable = False
+    start = time.perf_counter()
+    try:
+        func(field, *args, **kwargs)
+        return time.perf_counter() - start
+    finally:
+        del field
+        try:
+            shm.close()
+        except BufferError:
+            # 还有对象（如 matplotlib 图像的循环引用）引用着这块内存，回收后再关
+            gc.collect()
+            shm.close()
+
+
+class RenderFarm:
+    def __init__(self, workers=None):
+        """
+        workers: 渲染进程数，None 表示使用全部 CPU。
+        用法：
+            with RenderFarm() as farm:
+                field = farm.share(noise)
+                farm.submit(field, 'Colorbar gray', plot_colorbar_field, 'gray', res, path)
+                for label, seconds in farm.as_completed(): ...
+        func 需为模块级函数，第一个参数为噪声场。
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        self._fields = []
+        self._pending = {}    # future -> (标签, SharedField)
+        self._remaining = {}  # id(SharedField) -> 未完成的产物数
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(cancel=exc_type is not None)
+
+    def share(self, noise, normalize=True):
+        """把一张场放进共享内存（只拷贝这一次）"""
+        field = SharedField(noise, normalize)
+        self._fields.append(field)
+        self._remaining[id(field)] = 0
+        return field
+
+    def submit(self, field, label, func, *args, **kwargs):
+        """提交一个产物：子进程中执行 func(field 的数组, *args, **kwargs)"""
+        # 开启运行记录时，子进程里的记录随结果一起带回
+        task = instrument.worker(render_artifact)
+        future = self._executor.submit(task, field.spec, func, args, kwargs)
+        self._pending[future] = (label, field)
+        self._remaining[id(field)] += 1
+        return future
+
+    def as_completed(self):
+        """按完成顺序逐个产出 (标签, 耗时)，并打印进度；某个产物失败时抛出它的异常"""
+        total = len(self._pending)
+        start = time.perf_counter()
+        for done, future in enumerate(as_completed(list(self._pending)), start=1):
+            label, field = self._pending.pop(future)
+            seconds = instrument.unwrap(future.result(), artifact=label)
+            print(f"产物 {done}/{total} 完成: {label}（{seconds:.2f}s）")
+            self._remaining[id(field)] -= 1
+            if self._remaining[id(field)] == 0:
+                self._release(field)
+            yield label, seconds
+        elapsed = time.perf_counter() - start
+        print(f"共 {total} 个产物，{self.workers} 个渲染进程，用时 {elapsed:.2f}s")
+
+    def run(self):
+        """等待所有已提交的产物完成，返回 {标签: 耗时}"""
+        return dict(self.as_completed())
+
+    def _release(self, field):
+        field.release()
+        self._fields.remove(field)
+        del self._remaining[id(field)]
+
+    def close(self, cancel=False):
+        self._executor.shutdown(wait=True, cancel_futures=cancel)
+        self._pending.clear()
+        for field in self._fields:
+            field.release()
+        self._fields.clear()
+        self._remaining.clear()
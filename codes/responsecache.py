@@ -0,0 +1,119 @@
+"""
+模型回答的磁盘缓存（gpteval 使用）
+
+键 = SHA-256(模型, 采样参数, 提示文字, 每张图片编码后字节的 SHA-256)，
+图片和提示都没变时重跑直接返回缓存的回答，只把未命中的请求发出去。
+每个回答一个 JSON 文件；可设置过期时间 ttl（秒），总大小超过上限时按最近使用时间（mtime）淘汰。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+DEFAULT_RESPONSE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'cache', 'responses')
+
+
+def _digest_content(content):
+    """把 messages 里的图片换成其字节的哈希，文字原样保留"""
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content:
+        if part.get("type") == "image_url":
+            url = part["image_url"]["url"]
+            parts.append({"image_sha256": hashlib.sha256(url.encode('utf-8')).hexdigest()})
+        else:
+            parts.append(part)
+    return parts
+
+
+def request_key(messages, model, params=None):
+    payload = {
+        "model": model,
+        "params": params or {},
+        "messages": [{"role": m["role"], "content": _digest_content(m["content"])} for m in messages],
+    }
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, cache_dir=DEFAULT_RESPONSE_DIR, ttl=None, max_disk_bytes=256 * 2**20):
+        """ttl: 回答的有效期（秒），None 表示永不过期"""
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def get(self, key):
+        """返回缓存的回答文本，未命中或已过期时返回 None"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        if self.ttl is not None and time.time() - entry["created"] > self.ttl:
+            self._remove(path)
+            self.misses += 1
+            return None
+        os.utime(path)  # 更新时间戳，LRU 依据
+        self.hits += 1
+        return entry["answer"]
+
+    def put(self, key, answer, **meta):
+        entry = {"created": time.time(), "answer": answer, **meta}
+        data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+        # 先写临时文件再改名，并发写同一个键也不会读到半个文件
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        path = self._path(key)
+        if os.path.exists(path):
+            self._total_bytes -= os.path.getsize(path)
+        os.replace(tmp_path, path)
+        self._total_bytes += len(data)
+        if self._total_bytes > self.max_disk_bytes:
+            self._evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:  # 被其他进程淘汰了
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self._total_bytes -= size
+        except OSError:
+            pass
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        # 淘汰到上限的 90%，避免之后每次写入都重新扫描目录
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes * 0.9:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+        self._total_bytes = total
@@ -0,0 +1,287 @@
+"""
+实验结果库（SQLite），取代散落在各处的 result.txt
+
+表：
+- stimuli:   每张刺激图一行（实验、文件名、噪声场、colormap、shape、res、octaves、轮次）
+- box_pairs: exp2 每张图的一对方框（位置、两框均值、较大的方框）
+- profiles:  exp3 每张图的 6 条剖面曲线（起点、长度、是否为真实曲线、与真实曲线的相关系数）
+- answers:   坐标类回答（findvalue 查出的真实值、模型给出的坐标），一行一个点
+在 experiment、colormap、res 等常用过滤列上建了索引，分析时直接用 SQL 查询，
+不必再用正则扫描目录树。旧的 txt 结果可用 import_legacy_results 导入。
+"""
+
+import os
+import re
+import sqlite3
+import time
+
+import numpy as np
+
+from sweep import FIELD_TAG_PATTERN
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'results.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stimuli (
+    id          INTEGER PRIMARY KEY,
+    experiment  TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    field       TEXT,
+    colormap    TEXT,
+    height      INTEGER,
+    width       INTEGER,
+    res_x       INTEGER,
+    res_y       INTEGER,
+    octaves     INTEGER,
+    persistence REAL,
+    round       INTEGER,
+    UNIQUE (experiment, name)
+);
+CREATE INDEX IF NOT EXISTS idx_stimuli_experiment ON stimuli (experiment, colormap);
+CREATE INDEX IF NOT EXISTS idx_stimuli_colormap ON stimuli (colormap);
+CREATE INDEX IF NOT EXISTS idx_stimuli_res ON stimuli (res_x, res_y, octaves);
+
+CREATE TABLE IF NOT EXISTS box_pairs (
+    stimulus_id INTEGER PRIMARY KEY REFERENCES stimuli (id) ON DELETE CASCADE,
+    x1          INTEGER,
+    y1          INTEGER,
+    x2          INTEGER,
+    y2          INTEGER,
+    size        INTEGER NOT NULL,
+    mean1       REAL NOT NULL,
+    mean2       REAL NOT NULL,
+    larger      TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS profiles (
+    stimulus_id INTEGER NOT NULL REFERENCES stimuli (id) ON DELETE CASCADE,
+    curve       INTEGER NOT NULL,
+    x           INTEGER,
+    y           INTEGER,
+    length      INTEGER,
+    is_real     INTEGER NOT NULL,
+    corr        REAL,
+    PRIMARY KEY (stimulus_id, curve)
+);
+
+CREATE TABLE IF NOT EXISTS answers (
+    id          INTEGER PRIMARY KEY,
+    experiment  TEXT NOT NULL,
+    source      TEXT NOT NULL,
+    colormap    TEXT,
+    folder      TEXT,
+    image       TEXT,
+    field       TEXT,
+    seq         INTEGER,
+    target      REAL,
+    x           INTEGER,
+    y           INTEGER,
+    value       REAL,
+    status      TEXT,
+    model       TEXT,
+    created     REAL
+);
+CREATE INDEX IF NOT EXISTS idx_answers_experiment ON answers (experiment, colormap, source);
+CREATE INDEX IF NOT EXISTS idx_answers_folder ON answers (folder);
+"""
+
+ANSWER_COLUMNS = ('experiment', 'source', 'colormap', 'folder', 'image', 'field', 'seq',
+                  'target', 'x', 'y', 'value', 'status', 'model', 'created')
+
+FIELD_NAME_PATTERN = FIELD_TAG_PATTERN  # 与 sweep.field_tag 生成的文件名对应
+COORD_PATTERN = re.compile(r'([\d.]+):\s*\((\d+)\s*,\s*(\d+)\)')
+
+
+def field_params(field, meta=None):
+    """
+    噪声场参数：优先取 FieldStore 的元数据，没有时从文件名
+    （如 Noise_(630, 820)_(1, 1)_5，见 sweep.field_tag）里解析。
+    """
+    params = dict((meta or {}).get('params', {}))
+    match = FIELD_NAME_PATTERN.search(field or '')
+    if match and not params:
+        h, w, rx, ry, octaves = map(int, match.groups()[:5])
+        params = {'shape': [h, w], 'res': [rx, ry], 'octaves': octaves}
+        persistence, engine = match.group(6), match.group(7)
+        params['persistence'] = 0.5 if persistence is None else float(persistence)
+        if engine is not None:
+            params['engine'] = engine
+    return params
+
+
+def parse_coordinate_answer(text):
+    """模型回答中的 "1.0: (200, 150)" 行 -> [(目标值, x, y), ...]"""
+    return [(float(v), int(x), int(y)) for v, x, y in COORD_PATTERN.findall(text)]
+
+
+class ResultStore:
+    def __init__(self, path=DEFAULT_DB):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.commit()
+        self.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    # ---------- 写入 ----------
+    def add_stimulus(self, experiment, name, colormap=None, field=None, params=None, round=None):
+        """登记一张刺激图（同一实验下同名则覆盖），返回其 id"""
+        params = params or {}
+        shape = params.get('shape') or (None, None)
+        res = params.get('res') or (None, None)
+        values = (experiment, name, field, colormap, shape[0], shape[1], res[0], res[1],
+                  params.get('octaves'), params.get('persistence'), round)
+        self.conn.execute(
+            "INSERT INTO stimuli (experiment, name, field, colormap, height, width, res_x, res_y, "
+            "octaves, persistence, round) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (experiment, name) DO UPDATE SET field = excluded.field, "
+            "colormap = excluded.colormap, height = excluded.height, width = excluded.width, "
+            "res_x = excluded.res_x, res_y = excluded.res_y, octaves = excluded.octaves, "
+            "persistence = excluded.persistence, round = excluded.round", values)
+        return self.conn.execute("SELECT id FROM stimuli WHERE experiment = ? AND name = ?",
+                                 (experiment, name)).fetchone()[0]
+
+    def add_box_pair(self, stimulus_id, x1, y1, x2, y2, mean1, mean2, larger, size=100):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO box_pairs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (stimulus_id, _int(x1), _int(y1), _int(x2), _int(y2), int(size), float(mean1), float(mean2), larger))
+
+    def add_profiles(self, stimulus_id, curves):
+        """curves: 按显示顺序的 (x, y, length, is_real, corr)"""
+        self.conn.execute("DELETE FROM profiles WHERE stimulus_id = ?", (stimulus_id,))
+        self.conn.executemany(
+            "INSERT INTO profiles VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(stimulus_id, k + 1, _int(x), _int(y), _int(length), int(bool(is_real)), _float(corr))
+             for k, (x, y, length, is_real, corr) in enumerate(curves)])
+
+    def replace_answers(self, rows, **where):
+        """
+        先删除满足 where（列 = 值）的旧回答，再批量写入 rows（dict，键见 ANSWER_COLUMNS）。
+        重跑同一个文件时结果不会重复。
+        """
+        if where:
+            clause = " AND ".join(f"{key} IS ?" for key in where)
+            self.conn.execute(f"DELETE FROM answers WHERE {clause}", tuple(where.values()))
+        now = time.time()
+        self.conn.executemany(
+            f"INSERT INTO answers ({', '.join(ANSWER_COLUMNS)}) VALUES ({', '.join('?' * len(ANSWER_COLUMNS))})",
+            [tuple(now if key == 'created' else row.get(key) for key in ANSWER_COLUMNS) for row in rows])
+
+    # ---------- 查询 ----------
+    def query(self, sql, params=()):
+        return self.conn.execute(sql, params).fetchall()
+
+    def findvalue_columns(self, colormap, diff=False, source='findvalue'):
+        """
+        findvalue 结果按文件夹分列（与 txttocsv 脚本的列相同）：
+        diff=False 为查到的值，diff=True 为 |目标值 - 查到的值|；查不到的点为 nan。
+        返回 {folder: np.ndarray}
+        """
+        rows = self.query(
+            "SELECT folder, target, value FROM answers WHERE experiment = 'exp1' AND source = ? "
+            "AND colormap = ? ORDER BY CAST(folder AS INTEGER), folder, seq", (source, colormap))
+        columns = {}
+        for row in rows:
+            value = np.nan if row['value'] is None else row['value']
+            if diff:
+                value = abs(row['target'] - value)
+            columns.setdefault(row['folder'], []).append(value)
+        return {folder: np.array(values, dtype=np.float64) for folder, values in columns.items()}
+
+
+def _int(value):
+    return None if value is None else int(value)
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+# ---------- 导入旧的 txt 结果 ----------
+FINDVALUE_LINE = re.compile(r'^([\d.]+):\s*\((\d+),\s*(\d+)\)\s*-\s*(.*)$')
+EXP2_LINE = re.compile(r'^(.*?), (\w+) Box Avg: ([\d.]+), (\w+) Box Avg: ([\d.]+), Larger Box: (\w+)$')
+EXP3_LINE = re.compile(r'^(.+?\.png) \+ 真实曲线是第 (\d+) 条$')
+
+
+def findvalue_rows(result_file, folder, colormap):
+    """解析 findvalue 输出的 {colormap}_result.txt"""
+    rows = []
+    with open(result_file, 'r', encoding='utf-8') as f:
+        for seq, line in enumerate(f):
+            match = FINDVALUE_LINE.match(line.strip())
+            if not match:
+                continue
+            target, x, y, rest = match.groups()
+            try:
+                value, status = float(rest), 'ok'
+            except ValueError:
+                value, status = None, rest.split(':')[0]
+            rows.append({'experiment': 'exp1', 'source': 'findvalue', 'colormap': colormap,
+                         'folder': folder, 'seq': seq, 'target': float(target),
+                         'x': int(x), 'y': int(y), 'value': value, 'status': status})
+    return rows
+
+
+def import_legacy_results(result_root, store, colormaps=('gray', 'hot', 'rainbow'),
+                          exp2_results=(), exp3_results=()):
+    """
+    导入旧的 txt 结果：
+    - result_root/<数字>/<colormap>_result.txt（findvalue）
+    - exp2_results: [(result.txt 路径, colormap)]（旧结果没有方框位置）
+    - exp3_results: [(result.txt 路径, colormap)]（只记录真实曲线的位置）
+    """
+    if os.path.isdir(result_root):
+        for folder in sorted((d for d in os.listdir(result_root) if d.isdigit()), key=int):
+            for colormap in colormaps:
+                path = os.path.join(result_root, folder, f"{colormap}_result.txt")
+                if os.path.exists(path):
+                    store.replace_answers(findvalue_rows(path, folder, colormap), experiment='exp1',
+                                          source='findvalue', folder=folder, colormap=colormap)
+
+    for path, colormap in exp2_results:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                match = EXP2_LINE.match(line.strip())
+                if match:
+                    name, _, mean1, _, mean2, larger = match.groups()
+                    stimulus_id = store.add_stimulus('exp2', name, colormap, params=field_params(name))
+                    # 旧结果里没有方框位置
+                    store.add_box_pair(stimulus_id, None, None, None, None, mean1, mean2, larger)
+
+    for path, colormap in exp3_results:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                match = EXP3_LINE.match(line.strip())
+                if match:
+                    name, real = match.group(1), int(match.group(2))
+                    stimulus_id = store.add_stimulus('exp3', name, colormap, params=field_params(name))
+                    store.add_profiles(stimulus_id, [(None, None, None, k + 1 == real, None) for k in range(6)])
+    store.commit()
+
+
+def main():
+    with ResultStore() as store:
+        import_legacy_results(r"../result", store)
+        for row in store.query("SELECT experiment, source, colormap, COUNT(*) AS n FROM answers "
+                               "GROUP BY experiment, source, colormap"):
+            print(dict(row))
+
+
+if __name__ == "__main__":
+    main()
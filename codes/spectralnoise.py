@@ -0,0 +1,73 @@
+"""
+频谱合成噪声引擎（Perlin 之外的另一种选择）
+
+在频域里给每个频率一个随机复数（高斯振幅 + 均匀相位），振幅按 1/f^(β/2) 缩放，
+再用实数逆 FFT（irfft2）变回空间域：
+- 只用整数周期的频率，结果在两个方向上都严格周期，天然无缝
+- 一次 FFT，耗时 O(N log N)，与 octaves 无关
+- β 为二维功率谱 P(f) ∝ 1/f^β 的指数；默认由 persistence 换算，
+  与 Perlin 叠加的频谱衰减一致（persistence=0.5 → β=4，即每个倍频程能量减为 1/4）
+
+调用方式与 noisegen.generate_seamless_perlin_noise_2d 相同：
+res 决定最低频率（最大特征尺度），octaves 决定频带宽度（最高频率 = res × 2^octaves）。
+"""
+
+import os
+
+import numpy as np
+
+import instrument
+
+
+def spectral_amplitude(shape, res, octaves=5, persistence=0.5, beta=None):
+    """rfft2 半平面 (H, W//2+1) 上每个频率的振幅，频带 [1, 2^octaves)（以 res 为单位）之外为 0"""
+    height, width = shape
+    if beta is None:
+        beta = 2 - 2 * np.log2(persistence)
+    # 以 res 为单位的频率：ky 沿行方向（res[0]），kx 沿列方向（res[1]），与 Perlin 的格子方向一致
+    ky = np.fft.fftfreq(height, 1 / height)[:, None] / res[0]
+    kx = np.fft.rfftfreq(width, 1 / width)[None, :] / res[1]
+    radius = np.hypot(ky, kx)
+    band = (radius >= 1) & (radius < 2 ** octaves)
+    amplitude = np.zeros_like(radius)
+    amplitude[band] = radius[band] ** (-beta / 2)
+    return amplitude
+
+
+@instrument.timed('noise')
+def generate_spectral_noise_2d(shape, res, octaves=5, persistence=0.5,
+                               dtype=np.float64, out=None, rng=None, tile=None, filepath=None,
+                               beta=None, std=0.15):
+    """
+    参数与 generate_seamless_perlin_noise_2d 相同，另外：
+    - beta: 功率谱指数，None 时由 persistence 换算
+    - std:  输出的标准差（均值为 0），默认与 5 个 octave 的 Perlin 噪声量级相当
+    rng 为 None 时使用全局 np.random。
+    FFT 需要整张场，tile 只为兼容接口：给定 filepath 时结果写入 .npy 并返回 memmap。
+    """
+    if tile is not None and filepath is None:
+        raise ValueError("分块模式需要指定 filepath")
+    height, width = shape
+    amplitude = spectral_amplitude(shape, res, octaves, persistence, beta)
+    if rng is None:
+        noise = np.random.standard_normal((2,) + amplitude.shape)
+    else:
+        noise = rng.standard_normal((2,) + amplitude.shape)
+    spectrum = amplitude * (noise[0] + 1j * noise[1])
+    field = np.fft.irfft2(spectrum, s=(height, width))
+    field_std = field.std()
+    if field_std > 0:
+        field *= std / field_std
+
+    if filepath is not None:
+        folder = os.path.dirname(filepath)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        out = np.lib.format.open_memmap(filepath, mode='w+', dtype=dtype, shape=(height, width))
+        out[...] = field
+        out.flush()
+        return out
+    if out is not None:
+        out[...] = field
+        return out
+    return field.astype(dtype, copy=False)
@@ -0,0 +1,119 @@
+"""
+批量频谱分析（取代逐张 compute_power_spectrum 出图）
+
+一次传入一叠噪声场 (N, H, W)（或噪声场列表）：
+- scipy.fft.rfft2 实数 FFT，只算一半频率平面，workers= 多线程
+- 每种 (H, W) 的径向分箱表（频率、箱号、权重）只建一次并缓存
+- 径向平均功率谱用一次 bincount 对所有场同时完成，结果为 (N, nbins) 的小数组
+- 频谱斜率（log P 对 log f 的最小二乘）对所有场一次求出
+整轮扫描的频率成分一次调用就能核对，不必为每张场保存一张 630×820 的功率谱图。
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import scipy.fft
+
+import instrument
+
+
+class SpectrumPlan:
+    def __init__(self, shape, nbins=None):
+        """
+        (H, W) 的 rfft2 半平面上每个频率所属的径向箱。
+        频率单位为 周期/像素，箱在 (0, 0.5] 上等宽；直流分量和超过 0.5 的角落不计入。
+        """
+        height, width = shape
+        self.shape = (height, width)
+        self.nbins = nbins or min(height, width) // 2
+        fy = scipy.fft.fftfreq(height)[:, None]
+        fx = scipy.fft.rfftfreq(width)[None, :]
+        radius = np.hypot(fy, fx)
+        bins = np.ceil(radius * 2 * self.nbins).astype(np.intp) - 1  # (0, 1/(2n)] -> 0
+        valid = (radius > 0) & (bins < self.nbins)
+
+        # 半平面之外的共轭频率：除第 0 列和（W 为偶数时的）最后一列外，每列代表两个频率
+        weights = np.full(radius.shape, 2.0)
+        weights[:, 0] = 1
+        if width % 2 == 0:
+            weights[:, -1] = 1
+        weights[~valid] = 0
+        self.bins = np.where(valid, bins, 0).ravel()
+        self.weights = weights.ravel()
+        self.counts = np.bincount(self.bins, self.weights, minlength=self.nbins)
+        edges = np.arange(self.nbins + 1) / (2 * self.nbins)
+        self.freqs = (edges[:-1] + edges[1:]) / 2
+
+    def radial_average(self, power):
+        """power: (N, H, W//2+1) -> (N, nbins)，空箱为 nan"""
+        n = power.shape[0]
+        flat = power.reshape(n, -1) * self.weights
+        # 第 k 张场的箱号整体平移 k * nbins，一次 bincount 完成所有场
+        index = (np.arange(n)[:, None] * self.nbins + self.bins).ravel()
+        sums = np.bincount(index, flat.ravel(), minlength=n * self.nbins).reshape(n, self.nbins)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return sums / self.counts
+
+
+@lru_cache(maxsize=16)
+def spectrum_plan(shape, nbins=None):
+    return SpectrumPlan(shape, nbins)
+
+
+def _batches(fields, batch):
+    if isinstance(fields, np.ndarray) and fields.ndim == 2:
+        fields = fields[np.newaxis]
+    for start in range(0, len(fields), batch):
+        yield np.stack([np.asarray(field) for field in fields[start:start + batch]])
+
+
+@instrument.timed('spectra')
+def radial_power_spectra(fields, nbins=None, workers=-1, batch=16):
+    """
+    fields: (N, H, W) 数组、(H, W) 数组或同尺寸噪声场的列表（可以是 mmap）。
+    float32 输入按单精度计算。每次最多 batch 张一起做 FFT，控制内存。
+    返回 (freqs (nbins,), power (N, nbins))，功率已按像素数归一化，各场先减去均值。
+    """
+    results = []
+    plan = None
+    for stack in _batches(fields, batch):
+        if plan is None:
+            plan = spectrum_plan(stack.shape[1:], nbins)
+        elif stack.shape[1:] != plan.shape:
+            raise ValueError(f"噪声场尺寸不一致: {stack.shape[1:]} 与 {plan.shape}")
+        if stack.dtype != np.float32:
+            stack = stack.astype(np.float64, copy=False)
+        stack = stack - stack.mean(axis=(1, 2), keepdims=True)
+        spectrum = scipy.fft.rfft2(stack, workers=workers)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        power /= stack.shape[1] * stack.shape[2]
+        results.append(plan.radial_average(power))
+    if plan is None:
+        raise ValueError("没有输入噪声场")
+    return plan.freqs, np.concatenate(results)
+
+
+def spectral_slopes(freqs, power, fmin=None, fmax=None):
+    """
+    log P = slope * log f + intercept 的最小二乘拟合，所有场一次求出。
+    fmin / fmax 限定拟合的频率范围（周期/像素）；功率为 0 或 nan 的箱不参与（对所有场取共同的箱）。
+    返回 (slopes (N,), intercepts (N,))
+    """
+    power = np.atleast_2d(power)
+    keep = np.all(np.isfinite(power) & (power > 0), axis=0)
+    if fmin is not None:
+        keep &= freqs >= fmin
+    if fmax is not None:
+        keep &= freqs <= fmax
+    if keep.sum() < 2:
+        raise ValueError("可用于拟合的频率箱少于 2 个")
+    design = np.column_stack([np.log(freqs[keep]), np.ones(keep.sum())])
+    coef, *_ = np.linalg.lstsq(design, np.log(power[:, keep]).T, rcond=None)
+    return coef[0], coef[1]
+
+
+def analyze_fields(fields, nbins=None, fmin=None, fmax=None, workers=-1, batch=16):
+    """径向功率谱 + 斜率，返回 {'freqs', 'power', 'slope', 'intercept'}"""
+    freqs, power = radial_power_spectra(fields, nbins, workers, batch)
+    slope, intercept = spectral_slopes(freqs, power, fmin, fmax)
+    return {'freqs': freqs, 'power': power, 'slope': slope, 'intercept': intercept}
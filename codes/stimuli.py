@@ -0,0 +1,61 @@
+"""
+内存中的刺激图流水线：噪声场 -> 着色 -> PNG（内存）-> base64 -> 请求体
+
+不再先把 PNG 写到磁盘、再由 gpttest 读回来编码。各步都是生成器，逐张产出，
+交给 gpteval.EvalClient 时，生成 / 编码下一张图与前面请求的网络等待重叠进行。
+保存到磁盘只是可选的旁路输出（save_dir）。
+"""
+
+import base64
+import os
+
+import numpy as np
+
+from gpteval import build_messages
+from raster import apply_lut, colormap_lut, encode_png, field_indices
+from sweep import field_tag, generate_job_noise
+
+
+def png_base64(png_bytes):
+    return base64.b64encode(png_bytes).decode('ascii')
+
+
+def scalar_field_stimuli(jobs, dtype=np.float64, cache=False):
+    """
+    每个任务（sweep.build_jobs）生成一次噪声、量化一次，每种 colormap 查表得到一张图。
+    产出 (image_id, pixels, info)，image_id 与 exp1makepic 的文件名一致。
+    cache=True 时噪声场经 fieldcache 读取，exp1makepic 已生成过的场不再重新生成。
+    """
+    for job in jobs:
+        shape, res, octaves = job['shape'], job['res'], job['octaves']
+        indices = field_indices(generate_job_noise(job, dtype, cache=cache))
+        for colormap in job['colormaps']:
+            image_id = f"ScalarField_{colormap}_{field_tag(job)}.png"
+            info = {'colormap': colormap, 'height': shape[0], 'width': shape[1],
+                    'res': res, 'octaves': octaves, 'persistence': job['persistence']}
+            yield image_id, apply_lut(indices, colormap_lut(colormap)), info
+
+
+def encoded_stimuli(stimuli, save_dir=None):
+    """
+    像素编码成内存中的 PNG 字节串，产出 (image_id, png_bytes, info)。
+    save_dir 不为 None 时顺便把同样的字节写到磁盘（不会再编码一次）。
+    """
+    if save_dir is not None:
+        os.makedirs(save_dir, exist_ok=True)
+    for image_id, pixels, info in stimuli:
+        png_bytes = encode_png(pixels)
+        if save_dir is not None:
+            with open(os.path.join(save_dir, image_id), 'wb') as f:
+                f.write(png_bytes)
+        yield image_id, png_bytes, info
+
+
+def stimulus_requests(stimuli, prompt, save_dir=None):
+    """
+    产出 (image_id, messages)，可直接交给 EvalClient.evaluate。
+    prompt: 字符串，或 prompt(info) -> 字符串（按 colormap、尺寸等生成提示）
+    """
+    for image_id, png_bytes, info in encoded_stimuli(stimuli, save_dir):
+        text = prompt(info) if callable(prompt) else prompt
+        yield image_id, build_messages(text, png_base64(png_bytes))
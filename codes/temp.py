@@ -1,34 +1,32 @@
-import numpy as np
-import matplotlib.pyplot as plt
 import os
-import random
+
+from boxstats import BoxStats, sample_box_pairs
+from compositor import render_base, save, stamp_box
+from fieldstore import FieldStore
 
 # 生成图像并添加随机红蓝方框，同时比较方框内平均值
-def generate_image_with_boxes_and_compare(noise, colormap, output_filepath, result_filepath, box_count=8):
-    height, width = noise.shape
+def generate_image_with_boxes_and_compare(noise, colormap, output_filepath, result_filepath, box_count=8,
+                                          target_diff=None, rng=None):
+    """
+    target_diff: 两框均值差的目标值（控制难度），None 表示不限制
+    rng:         np.random.Generator 或种子，None 表示随机
+    """
+    # 着色底图只渲染一次，8 组方框共用
+    base = render_base(noise, colormap)
+
+    # 建一次积分图，批量抽取 box_count 对不重叠的 100x100 区域（距离边界至少 30 格），
+    # 均值直接由积分图得到；一半的对红框更大，一半蓝框更大
+    pairs = sample_box_pairs(BoxStats(noise), box_count, size=100, margin=30, rng=rng,
+                             target_diff=target_diff)
 
     # 打开结果文件
     with open(result_filepath, "a") as result_file:  # "a" 模式为追加写入
-        # 随机选择两个不重叠的 100x100 区域
-        def random_box():
-            x = random.randint(30, width - 130)  # 确保距离边界至少 30 格
-            y = random.randint(30, height - 130)
-            return x, y
-
         for i in range(box_count):
-            # 确保两个区域不重叠
-            while True:
-                x1, y1 = random_box()
-                x2, y2 = random_box()
-                if not (x1 < x2 + 100 and x1 + 100 > x2 and y1 < y2 + 100 and y1 + 100 > y2):
-                    break
-
-            # 从噪声矩阵中提取红蓝方框内的值
-            red_box_values = noise[y1:y1 + 100, x1:x1 + 100]
-            blue_box_values = noise[y2:y2 + 100, x2:x2 + 100]
-            # 计算两个方框内的平均值
-            red_box_avg = np.mean(red_box_values)
-            blue_box_avg = np.mean(blue_box_values)
+            x1, y1 = int(pairs['x1'][i]), int(pairs['y1'][i])
+            x2, y2 = int(pairs['x2'][i]), int(pairs['y2'][i])
+            # 两个方框内的平均值
+            red_box_avg = pairs['mean1'][i]
+            blue_box_avg = pairs['mean2'][i]
 
             # 动态设置方框颜色和文字描述
             if colormap == "hot":
@@ -64,54 +62,39 @@ def generate_image_with_boxes_and_compare(noise, colormap, output_filepath, resu
                 f"较大方框: {larger_box_color.capitalize()}"
             )
 
-            # 绘制图像并添加方框
-            plt.figure(figsize=(8, 6))
-            plt.imshow(noise, cmap=colormap, origin='upper')
-            plt.axis('off')  # 关闭所有坐标轴
-            plt.gca().set_axis_off()  # 确保没有任何轴信息
-            plt.subplots_adjust(top=1, bottom=0, left=0, right=1, hspace=0, wspace=0)  # 调整布局
-            plt.margins(0, 0)
-
-            # 绘制红色方框（区域 1）
-            rect1 = plt.Rectangle((x1, y1), 100, 100, edgecolor=red_color, facecolor='none', linewidth=2)
-            plt.gca().add_patch(rect1)
-
-            # 绘制蓝色方框（区域 2）
-            rect2 = plt.Rectangle((x2, y2), 100, 100, edgecolor=blue_color, facecolor='none', linewidth=2)
-            plt.gca().add_patch(rect2)
+            # 在底图的副本上直接画两个方框（底图每张噪声场只栅格化一次）
+            pixels = base.copy()
+            stamp_box(pixels, x1, y1, 100, 100, red_color)  # 红色方框（区域 1）
+            stamp_box(pixels, x2, y2, 100, 100, blue_color)  # 蓝色方框（区域 2）
 
             # 保存图像
             output_filepath_with_index = output_filepath.replace(".png", f"_{i + 1}.png")
-            plt.savefig(output_filepath_with_index, dpi=150, bbox_inches='tight', pad_inches=0)
-            plt.close()
+            save(pixels, output_filepath_with_index)
             print(f"第 {i + 1} 个带方框的图像已保存: {output_filepath_with_index}")
 
 
 # 主函数
 def main():
-    csv_dir = r"E:\桌面\Final project\data\uncolor"  # 存储 CSV 的目录
+    csv_dir = r"E:\桌面\Final project\data\uncolor"  # 存储噪声数据（.npy / 旧 CSV）的目录
     colormap = 'rainbow'  # 使用的 colormap
     output_dir = f"E:\桌面\Final project\color\\newexp2\{colormap}"  # 输出图像文件夹
     result_filepath = os.path.join(output_dir, "result.txt")  # 结果文件路径
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
+    store = FieldStore(csv_dir)
     # 清空结果文件（如果已存在）
     with open(result_filepath, "w") as result_file:
         result_file.write("")
-    # 遍历所有 CSV 文件
-    for csv_filename in os.listdir(csv_dir):
-        if csv_filename.endswith(".csv"):
-            csv_filepath = os.path.join(csv_dir, csv_filename)
-            # 加载 CSV 数据
-            print(f"正在读取 CSV 文件: {csv_filepath}")
-            noise = np.loadtxt(csv_filepath, delimiter=",", skiprows=1)  # 跳过 header 行
-            # 归一化到 [0,1] 区间（如果之前保存时未归一化，则需要此步骤）
-            noise = (noise - noise.min()) / (noise.max() - noise.min())
-            # 构造输出文件名
-            image_filename = f"ScalarField_WithBoxes_{os.path.splitext(csv_filename)[0]}_{colormap}.png"
-            output_filepath = os.path.join(output_dir, image_filename)
-            # 生成 8 个图像并添加不同的随机方框，比较方框平均值
-            generate_image_with_boxes_and_compare(noise, colormap, output_filepath, result_filepath, box_count=8)
+    # 遍历所有噪声场（.npy；旧目录中只有 CSV 的也能读取）
+    for field_name in store.names():
+        # 加载噪声数据（mmap 零拷贝读取，已归一化到 [0,1] 区间）
+        print(f"正在读取噪声场: {field_name}")
+        noise = store.load(field_name)
+        # 构造输出文件名
+        image_filename = f"ScalarField_WithBoxes_{field_name}_{colormap}.png"
+        output_filepath = os.path.join(output_dir, image_filename)
+        # 生成 8 个图像并添加不同的随机方框，比较方框平均值
+        generate_image_with_boxes_and_compare(noise, colormap, output_filepath, result_filepath, box_count=8)
 
 
 if __name__ == "__main__":
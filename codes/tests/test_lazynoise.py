@@ -0,0 +1,74 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lazynoise import LazyNoise
+from noisegen import generate_seamless_perlin_noise_2d
+from sweep import build_jobs, generate_job_noise
+
+SHAPE = (96, 160)
+RES = (3, 5)
+
+
+@pytest.fixture(params=[np.float64, np.float32])
+def pair(request):
+    """同一种子的 LazyNoise 和一次性生成的整张场"""
+    dtype = request.param
+    lazy = LazyNoise(SHAPE, RES, 4, dtype=dtype, rng=np.random.default_rng(0))
+    full = generate_seamless_perlin_noise_2d(SHAPE, RES, 4, dtype=dtype, rng=np.random.default_rng(0))
+    return lazy, full
+
+
+def test_materialize_bit_identical(pair):
+    lazy, full = pair
+    field = lazy.materialize()
+    assert field.dtype == full.dtype
+    assert np.array_equal(field, full)
+    assert np.array_equal(np.asarray(lazy), full)
+
+
+def test_window_and_segment_bit_identical(pair):
+    lazy, full = pair
+    for y, x, height, width in [(0, 0, 1, 1), (17, 33, 40, 51), (50, 100, 46, 60), (95, 0, 1, 160)]:
+        assert np.array_equal(lazy.window(y, x, height, width), full[y:y + height, x:x + width])
+    assert np.array_equal(lazy.segment(42, 7, 120), full[42, 7:127])
+
+
+def test_points_bit_identical(pair):
+    lazy, full = pair
+    rng = np.random.default_rng(1)
+    ys = rng.integers(0, SHAPE[0], 500)
+    xs = rng.integers(0, SHAPE[1], 500)
+    assert np.array_equal(lazy.points(ys, xs), full[ys, xs])
+    assert lazy[5, 9] == full[5, 9]
+    assert lazy[-1, -1] == full[-1, -1]
+
+
+def test_getitem_slices(pair):
+    lazy, full = pair
+    for key in [np.s_[10:30, 20:70], np.s_[::7, 3::11], np.s_[40, 10:90], np.s_[5:60, -3], np.s_[:, :]]:
+        assert np.array_equal(lazy[key], full[key])
+
+
+def test_normalized_matches_job_noise():
+    """from_job 与 sweep.generate_job_noise 的归一化场逐位一致（分块统计最小 / 最大值）"""
+    job = build_jobs(SHAPE, [RES], octaves_list=(5,), seed=3)[0]
+    full = generate_job_noise(job)
+    lazy = LazyNoise.from_job(job)
+    lazy.value_range(tile=(32, 48))
+    assert np.array_equal(lazy.window(10, 20, 50, 90), full[10:60, 20:110])
+    assert np.array_equal(lazy.materialize(), full)
+
+
+def test_out_of_range():
+    lazy = LazyNoise(SHAPE, RES, 2, rng=np.random.default_rng(0))
+    with pytest.raises(IndexError):
+        lazy.window(90, 0, 10, 10)
+    with pytest.raises(IndexError):
+        lazy.points([SHAPE[0]], [0])
+    with pytest.raises(ValueError):
+        LazyNoise.from_job(build_jobs(SHAPE, [RES], engine='spectral')[0])